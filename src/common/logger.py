@@ -6,32 +6,126 @@ import os
 import sys
 import logging
 import logging.handlers
+import json
 import queue
-import threading
-from typing import Optional, Dict, Any
+import functools
+import contextlib
+import multiprocessing
+from typing import Optional, Dict, Any, Iterator
 from datetime import datetime
 
 
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    结合大小和时间轮转的文件处理器
+    文件大小在进程内按已写入字节数累计，仅在打开文件或轮转后 fstat 一次，
+    避免每条日志都执行 exists + stat 两次系统调用
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, **kwargs):
+        self.max_bytes = max_bytes  # <=0 表示不按大小轮转
+        self._approx_size: Optional[int] = None  # None 表示需要重新获取文件大小
+        self._last_len = 0
+        super().__init__(filename, **kwargs)
+
+    def _current_size(self) -> int:
+        """获取当前日志文件的实际大小"""
+        try:
+            if self.stream is not None:
+                return os.fstat(self.stream.fileno()).st_size
+            if os.path.exists(self.baseFilename):
+                return os.path.getsize(self.baseFilename)
+        except OSError:
+            pass
+        return 0
+
+    def format(self, record: logging.LogRecord) -> str:
+        msg = super().format(record)
+        # 记录本条日志写入文件的字节数（含换行符）
+        self._last_len = len((msg + self.terminator).encode(self.encoding or 'utf-8', errors='replace'))
+        return msg
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        # 检查文件大小
+        if self.max_bytes > 0:
+            if self._approx_size is None:
+                self._approx_size = self._current_size()
+            if self._approx_size >= self.max_bytes:
+                return 1
+        # 检查时间
+        return super().shouldRollover(record)
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self._approx_size = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._last_len = 0
+        super().emit(record)
+        if self._approx_size is not None:
+            self._approx_size += self._last_len
+
+
+class BestEffortQueueHandler(logging.handlers.QueueHandler):
+    """
+    尽力而为的队列处理器
+    - 队列积压超过软上限时丢弃 WARNING 以下的记录，避免日志拖慢生产者线程；WARNING 及以上始终入队
+    - 丢弃的条数在积压缓解后的下一次入队（或关闭日志系统）时以一条 WARNING 记录报告
+    - 格式化统一交给监听线程完成，生产者线程不做 prepare 预处理
+    """
+
+    def __init__(self, log_queue, max_size: int = 0):
+        super().__init__(log_queue)
+        self.max_size = max_size  # <=0 表示不限制
+        self.dropped = 0  # 因积压被丢弃的记录数
+        self._reported = 0  # 已报告的丢弃数
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 同进程内的队列无需序列化，监听线程的处理器会自行格式化
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # SimpleQueue.qsize() 为近似值，作为软上限足够
+        if (record.levelno < logging.WARNING and self.max_size > 0
+                and self.queue.qsize() >= self.max_size):
+            self.dropped += 1
+            return
+        self.report_dropped()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def report_dropped(self) -> None:
+        """将上次报告以来丢弃的记录数作为一条 WARNING 记录入队"""
+        count = self.dropped - self._reported
+        if count <= 0:
+            return
+        self._reported = self.dropped
+        try:
+            self.queue.put_nowait(logging.makeLogRecord({
+                'name': 'tag_rag.logging',
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': '日志队列积压，已丢弃 %d 条低于 WARNING 级别的记录',
+                'args': (count,),
+            }))
+        except queue.Full:
+            pass
+
+
 class AsyncLoggingFactory:
-    """异步日志工厂"""
-    
-    _instance = None
-    _lock = threading.Lock()
-    
-    def __new__(cls):
-        with cls._lock:
-            if cls._instance is None:
-                cls._instance = super().__new__(cls)
-                cls._instance._initialized = False
-            return cls._instance
+    """异步日志工厂（通过 _get_factory() 获取进程内唯一实例）"""
     
     def __init__(self):
-        if not self._initialized:
-            self._loggers: Dict[str, logging.Logger] = {}
-            self._queue = queue.Queue(-1)  # 无限队列
-            self._listener = None
-            self._handlers = {}
-            self._initialized = True
+        self._loggers: Dict[str, logging.Logger] = {}
+        # SimpleQueue 为 C 实现的无界队列，put 只需一次加锁；
+        # 日志队列不需要 task_done/join 语义，因此无需 Queue 的额外簿记
+        self._queue = queue.SimpleQueue()
+        self._listener = None
+        self._queue_handler: Optional[BestEffortQueueHandler] = None
+        self._handlers = {}
+        self._config_key: Optional[str] = None  # 当前生效配置的规范化表示
     
     def configure(self, config: Dict[str, Any]) -> None:
         """
@@ -42,8 +136,16 @@ class AsyncLoggingFactory:
                 - level: 日志级别 (DEBUG, INFO, WARNING, ERROR)
                 - format: 日志格式字符串
                 - handlers: 处理器配置
+                - queue_max_size: 日志队列积压软上限，超出后丢弃 WARNING 以下的新记录（<=0 不限制）
         """
-        if self._listener and self._listener._thread.is_alive():
+        # 相同配置重复调用时直接返回，避免重建处理器和重启监听线程
+        config_key = json.dumps(config, sort_keys=True, default=str)
+        if config_key == self._config_key and self._listener and self._listener._thread:
+            return
+        self._config_key = config_key
+
+        if self._listener and self._listener._thread:
+            self._report_dropped()
             self._listener.stop()
         
         # 设置根日志级别
@@ -82,27 +184,10 @@ class AsyncLoggingFactory:
             backup_count = file_config.get('backup_count', 7)     # 保留7天
             when = file_config.get('when', 'midnight')           # 每天轮转
             
-            # 创建轮转文件处理器
-            file_handler = logging.handlers.TimedRotatingFileHandler(
-                filename=log_path,
-                when=when,
-                interval=1,
-                backupCount=backup_count,
-                encoding='utf-8'
-            )
-            
-            # 添加大小检查（通过自定义类实现）
-            class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
-                def shouldRollover(self, record):
-                    # 检查文件大小
-                    if os.path.exists(self.baseFilename):
-                        if os.stat(self.baseFilename).st_size >= max_bytes:
-                            return 1
-                    # 检查时间
-                    return super().shouldRollover(record)
-            
+            # 创建轮转文件处理器（结合大小和时间轮转）
             file_handler = SizedTimedRotatingFileHandler(
                 filename=log_path,
+                max_bytes=max_bytes,
                 when=when,
                 interval=1,
                 backupCount=backup_count,
@@ -113,9 +198,9 @@ class AsyncLoggingFactory:
             file_handler.setFormatter(formatter)
             self._handlers['file'] = file_handler
         
-        # 创建队列处理器
-        queue_handler = logging.handlers.QueueHandler(self._queue)
-        root_logger.addHandler(queue_handler)
+        # 创建队列处理器（积压超过软上限时丢弃，不阻塞业务线程）
+        self._queue_handler = BestEffortQueueHandler(self._queue, max_size=config.get('queue_max_size', 10000))
+        root_logger.addHandler(self._queue_handler)
         
         # 启动监听器
         self._listener = logging.handlers.QueueListener(
@@ -140,15 +225,35 @@ class AsyncLoggingFactory:
             self._loggers[name] = logger
         return self._loggers[name]
     
+    def _report_dropped(self) -> None:
+        """在监听线程停止前报告尚未报告的丢弃数"""
+        handler = self._queue_handler
+        if handler is not None:
+            handler.acquire()
+            try:
+                handler.report_dropped()
+            finally:
+                handler.release()
+
     def shutdown(self) -> None:
         """关闭日志系统"""
         if self._listener:
+            self._report_dropped()
             self._listener.stop()
         logging.shutdown()
 
 
+@functools.cache
+def _get_factory() -> AsyncLoggingFactory:
+    """获取全局唯一的日志工厂（functools.cache 保证只创建一次）"""
+    return AsyncLoggingFactory()
+
+
 # 全局工厂实例
-_factory = AsyncLoggingFactory()
+_factory = _get_factory()
+
+# 快捷函数使用的默认logger（logging.getLogger 保证同名实例唯一，重新配置后仍然有效）
+_default_logger = _factory.get_logger('tag_rag')
 
 
 def configure_logging(config: Dict[str, Any]) -> None:
@@ -179,35 +284,68 @@ def shutdown_logging() -> None:
     _factory.shutdown()
 
 
+class _ForwardHandler(logging.Handler):
+    """将工作进程发来的日志记录交给本进程的同名 logger，由本进程的日志队列统一输出"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def _init_worker_logging(log_queue, level: int) -> None:
+    """工作进程初始化：根 logger 只保留一个写入跨进程队列的处理器（fork 继承来的处理器在子进程中无人消费）"""
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+
+@contextlib.contextmanager
+def worker_logging() -> Iterator[Dict[str, Any]]:
+    """
+    为进程池转发工作进程的日志（对外接口）
+    产出传给 ProcessPoolExecutor 的 initializer/initargs 参数；应在进程池关闭之后退出
+    
+    用法:
+        with worker_logging() as log_kwargs, ProcessPoolExecutor(**log_kwargs) as executor:
+            ...
+    """
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(log_queue, _ForwardHandler())
+    listener.start()
+    try:
+        yield {"initializer": _init_worker_logging, "initargs": (log_queue, logging.getLogger().level)}
+    finally:
+        listener.stop()
+        log_queue.close()
+
+
 # 常用快捷函数
 def debug(msg: str, *args, **kwargs) -> None:
     """DEBUG级别日志"""
-    logger = get_logger('tag_rag')
-    logger.debug(msg, *args, **kwargs)
+    _default_logger.debug(msg, *args, **kwargs)
 
 
 def info(msg: str, *args, **kwargs) -> None:
     """INFO级别日志"""
-    logger = get_logger('tag_rag')
-    logger.info(msg, *args, **kwargs)
+    _default_logger.info(msg, *args, **kwargs)
 
 
 def warning(msg: str, *args, **kwargs) -> None:
     """WARNING级别日志"""
-    logger = get_logger('tag_rag')
-    logger.warning(msg, *args, **kwargs)
+    _default_logger.warning(msg, *args, **kwargs)
 
 
 def error(msg: str, *args, **kwargs) -> None:
     """ERROR级别日志"""
-    logger = get_logger('tag_rag')
-    logger.error(msg, *args, **kwargs)
+    _default_logger.error(msg, *args, **kwargs)
 
 
 def exception(msg: str, *args, **kwargs) -> None:
     """异常日志（自动包含堆栈）"""
-    logger = get_logger('tag_rag')
-    logger.exception(msg, *args, **kwargs)
+    _default_logger.exception(msg, *args, **kwargs)
 
 
 # 上下文管理器，用于临时修改日志级别
@@ -1,14 +1,14 @@
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Tag:
-    """标签定义"""
+    """标签定义（不可变，相同标签可在多个块之间共享同一实例）"""
     key: str
     value: str
     original_text: str
 
-@dataclass
+@dataclass(slots=True)
 class ParsedBlock:
     """
     这是模块一的产物，也是模块二的输入。
@@ -18,7 +18,7 @@ class ParsedBlock:
     content: str        # 文本
     start_line: int
     end_line: int
-    tags: List[Tag]     # 元数据
+    tags: Tuple[Tag, ...]  # 元数据（不可变元组，继承的标签在块之间共享）
     is_splited: bool = False  # 新增：是否被切分
     protected_element_type: Optional[str] = None  # 新增：保护元素类型（'code', 'table'）
     protected_element_overlength: bool = False  # 新增：保护元素本身是否超长
@@ -1,7 +1,28 @@
 import yaml
 import os
 import re
-from typing import List, Pattern
+import glob
+import json
+from typing import List, Optional, Pattern, Tuple
+
+# 依赖分组编号/名称的写法：数字反向引用、命名反向引用、条件分组。合并后分组编号会偏移，这类规则不参与合并
+_GROUP_REF_RE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+# 内联全局标志（如 (?i)）：合并后会作用于全部规则（Python 3.10 仅给出 DeprecationWarning），这类规则不参与合并
+_INLINE_FLAGS_RE = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+def _combine_patterns(patterns: List[str]) -> Optional[Pattern]:
+    """
+    将多个排除规则合并为单个交替正则，一次匹配即可判断是否命中任一规则；
+    规则含内联全局标志或反向引用（合并后语义会改变），或合并后无法编译时返回 None
+    """
+    if len(patterns) < 2 or any(_GROUP_REF_RE.search(p) or _INLINE_FLAGS_RE.search(p) for p in patterns):
+        return None
+    try:
+        return re.compile("|".join(f"(?:{p})" for p in patterns))
+    except re.error:
+        return None
+
 
 class ConfigManager:
     _instance = None
@@ -17,8 +38,7 @@ class ConfigManager:
             # Docker 容器内路径回退逻辑
             path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config.yaml")
         
-        with open(path, 'r', encoding='utf-8') as f:
-            self._raw = yaml.safe_load(f)
+        self._raw = self._read_raw_config(path)
 
         # 模块一配置
         p_conf = self._raw.get('parser', {})
@@ -27,25 +47,51 @@ class ConfigManager:
         self.file_extensions = p_conf.get('file_extensions', ['.md', '.markdown'])
         self.chunk_max_chars = p_conf.get('chunk_strategy', {}).get('max_chars', 450)
         self.chunk_overlap = p_conf.get('chunk_strategy', {}).get('overlap_rows', 1)
+        # 多文件解析的进程数，未配置（None）时使用 CPU 核数
+        self.parser_max_workers: Optional[int] = p_conf.get('max_workers')
 
         # 标签配置
         t_conf = self._raw.get('tags', {})
         self.tag_prefix = t_conf.get('prefix', '?')
-        self.exclude_patterns: List[Pattern] = [
-            re.compile(p) for p in t_conf.get('exclude_regex', [])
-        ]
+        exclude_regex = t_conf.get('exclude_regex', [])
+        self.exclude_patterns: List[Pattern] = [re.compile(p) for p in exclude_regex]
+        # 能安全合并时为单个交替正则，否则为 None（逐条匹配）
+        self.exclude_combined: Optional[Pattern] = _combine_patterns(exclude_regex)
+        # 实际用于匹配的规则：合并后的正则，或各条原始规则
+        self.exclude_matchers: Tuple[Pattern, ...] = (
+            (self.exclude_combined,) if self.exclude_combined is not None else tuple(self.exclude_patterns)
+        )
 
         # 模块二配置
         v_conf = self._raw.get('vector_store', {})
         self.vector_dim = v_conf.get('dimension', 1024)
         self.vector_store_provider = v_conf.get('provider', 'chromadb')
         self.batch_size = v_conf.get('batch_size', 512)
+        # 流水线同时在途的批次数：后续批次的嵌入请求与前面批次的存储重叠进行
+        self.vector_store_max_concurrent_batches = v_conf.get('max_concurrent_batches', 4)
+        # 批大小自动调优：开头的块依次试探若干候选批大小，选出单块耗时最小者并持久化
+        self.vector_store_autotune_batch_size = v_conf.get('autotune_batch_size', False)
+        # 调试模式：向量化后打印前几个块的增强文本
+        self.vector_store_debug = v_conf.get('debug', False)
+        # 失败块ID的追加日志（每行一个块ID，可据此重试）：未配置时位于输出目录下，配置为空字符串时不记录
+        failed_blocks_path = v_conf.get('failed_blocks_path')
+        self.vector_store_failed_blocks_path: str = (
+            os.path.join(self.output_dir, 'failed_blocks.txt') if failed_blocks_path is None else failed_blocks_path
+        )
         
         # 嵌入配置
         embedding_conf = v_conf.get('embedding', {})
         self.embedding_api_base = embedding_conf.get('api_base', 'https://api.siliconflow.cn/v1')
         self.embedding_model = embedding_conf.get('model', 'BAAI/bge-large-zh-v1.5')
         self.embedding_api_key = embedding_conf.get('api_key', '')
+        # 同时在途的嵌入请求数（子批次并发发送，重叠网络延迟）
+        self.embedding_max_concurrent_requests = embedding_conf.get('max_concurrent_requests', 4)
+        # 向量磁盘缓存（SQLite 文件路径，为空则不缓存）：内容未变化的文本重复入库时不再请求API
+        self.embedding_cache_path = embedding_conf.get('cache_path', './embedding_cache.sqlite3')
+        # tiktoken 编码名（如 cl100k_base），配置后用于精确计数令牌；为空时使用启发式估算
+        self.embedding_tiktoken_encoding = embedding_conf.get('tiktoken_encoding')
+        # 响应中向量的编码：base64（float32 原始字节，传输量小、解析快）或 float（JSON 浮点列表）
+        self.embedding_encoding_format = embedding_conf.get('encoding_format', 'base64')
         
         # 速率限制配置
         rate_limit_conf = embedding_conf.get('rate_limit', {})
@@ -58,9 +104,60 @@ class ConfigManager:
         chroma_conf = v_conf.get('chromadb', {})
         self.chroma_persist_directory = chroma_conf.get('persist_directory', './chroma_db')
         self.chroma_collection_name = chroma_conf.get('collection_name', 'tag_rag_vectors')
+        # 每次写入ChromaDB的块数：流水线累计多个批次后一次性 upsert
+        self.chroma_store_batch_size = chroma_conf.get('store_batch_size', 1000)
+        # HNSW 索引参数（仅在创建集合时生效）
+        hnsw_conf = chroma_conf.get('hnsw', {})
+        self.chroma_hnsw_space = hnsw_conf.get('space', 'cosine')
+        self.chroma_hnsw_m = hnsw_conf.get('m', 32)
+        self.chroma_hnsw_construction_ef = hnsw_conf.get('construction_ef', 200)
+        self.chroma_hnsw_search_ef = hnsw_conf.get('search_ef', 100)
 
         # 日志配置
         log_conf = self._raw.get('logging', {})
         self.log_level = log_conf.get('level', 'INFO')
         self.log_format = log_conf.get('format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        # 日志队列积压软上限，超出后丢弃 WARNING 以下的记录（<=0 不限制）
+        self.log_queue_max_size = log_conf.get('queue_max_size', 10000)
         self.log_handlers = log_conf.get('handlers', {})
+
+    def is_excluded(self, text: str) -> bool:
+        """判断标签文本是否命中排除规则（从文本开头匹配）"""
+        return any(p.match(text) for p in self.exclude_matchers)
+
+    @staticmethod
+    def _read_raw_config(path: str) -> dict:
+        """
+        读取原始配置字典。
+        以 YAML 文件的 mtime 作为版本号，在其旁边缓存一份 JSON（<path>.<mtime_ns>.cache.json），
+        配置未修改时直接 json.load，跳过较慢的 YAML 解析。
+        """
+        mtime = os.stat(path).st_mtime_ns
+        cache_path = f"{path}.{mtime}.cache.json"
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass  # 缓存损坏，回退到解析 YAML
+
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = yaml.safe_load(f)
+
+        try:
+            text = json.dumps(raw, ensure_ascii=False)
+            # 非字符串键、日期等无法无损转换为 JSON 的配置不做缓存
+            if json.loads(text) != raw:
+                return raw
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path)
+            # 清理旧版本的缓存文件
+            for stale in glob.glob(f"{glob.escape(path)}.*.cache.json"):
+                if stale != cache_path:
+                    os.remove(stale)
+        except (OSError, TypeError, ValueError):
+            # 配置目录只读等情况下不使用缓存，不影响正常加载
+            pass
+        return raw
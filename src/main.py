@@ -1,37 +1,190 @@
 import os
 import sys
-import json
 import argparse
-from dataclasses import asdict
-from typing import List
+import queue
+import threading
+import orjson
+from dataclasses import fields
+from typing import Iterable, List, Optional
 
 # 路径 Hack (确保 Docker 容器内能找到包)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.common.logger import configure_logging, get_logger
 
+from src.common.types import ParsedBlock, Tag
 from src.config.manager import ConfigManager
 from src.modules.md_parser.pipeline import MarkdownParserPipeline
 from src.modules.vector_store.connector import VectorStoreConnector
 
 
-def process_files(*file_paths: str, output_json: bool = True) -> List[dict]:
+# 字段名只需计算一次，转换时按名取值，代替 asdict 的递归深拷贝
+_BLOCK_FIELDS = tuple(f.name for f in fields(ParsedBlock))
+_TAG_FIELDS = tuple(f.name for f in fields(Tag))
+
+
+def block_to_dict(block: ParsedBlock) -> dict:
+    """将块转换为字典（结果与 dataclasses.asdict 相同）"""
+    d = {name: getattr(block, name) for name in _BLOCK_FIELDS}
+    d['tags'] = [{name: getattr(t, name) for name in _TAG_FIELDS} for t in block.tags]
+    return d
+
+
+def save_blocks_json(blocks: Iterable[ParsedBlock], output_dir: str, jsonl: bool = False) -> str:
     """
-    抽象方法：处理可变数量的文件，返回解析后的块字典列表
+    将块逐个流式写入 JSON 文件（orjson 原生序列化 dataclass，无需 asdict 转换）
+    每次只序列化一个块，内存占用与块总数无关
     
     Args:
-        *file_paths: 可变数量的文件路径
-        output_json: 是否将结果保存为JSON文件
+        blocks: 解析后的块
+        output_dir: 输出目录
+        jsonl: 为True时每行写一个块（parsed_result.jsonl），否则写缩进的 JSON 数组（parsed_result.json）
         
     Returns:
-        List[dict]: 所有文件的块字典列表
+        str: 输出文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if jsonl:
+        out_path = os.path.join(output_dir, "parsed_result.jsonl")
+        with open(out_path, 'wb') as f:
+            for b in blocks:
+                f.write(orjson.dumps(b))
+                f.write(b"\n")
+        return out_path
+
+    out_path = os.path.join(output_dir, "parsed_result.json")
+    with open(out_path, 'wb') as f:
+        first = True
+        for b in blocks:
+            f.write(b"[\n  " if first else b",\n  ")
+            # 块内缩进整体右移一级，输出与 json.dump(indent=2) 的数组格式一致
+            # （字符串中的换行已被转义，替换只作用于结构换行）
+            f.write(orjson.dumps(b, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  "))
+            first = False
+        f.write(b"[]" if first else b"\n]")
+    return out_path
+
+
+class BackgroundVectorizer:
+    """
+    后台向量化消费者：从有界队列中取出块列表并写入向量库，
+    使向量化（受网络/接口速率限制）与其余文件的解析重叠进行
+
+    小文件的块先在提交端累积到 min_blocks 个再入队，消费端再合并队列中已有的全部块，
+    一次 save_blocks 覆盖多个文件，失败日志、存储缓冲、进度条等每次调用的开销不随文件数增长
+    """
+
+    _SENTINEL = None  # 生产者结束标记
+
+    def __init__(self, vector_store: VectorStoreConnector, maxsize: int = 4, min_blocks: Optional[int] = None):
+        self.vector_store = vector_store
+        # 每次入队的最少块数，默认与一次写入 ChromaDB 的块数一致
+        self.min_blocks = max(1, min_blocks or vector_store.config.chroma_store_batch_size)
+        self.logger = get_logger('tag_rag.main')
+        self._pending: List[ParsedBlock] = []
+        # 有界队列：向量化跟不上时阻塞解析端，避免待向量化的块无限堆积
+        self._queue: "queue.Queue[Optional[List[ParsedBlock]]]" = queue.Queue(maxsize=maxsize)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._consume, name="vectorizer", daemon=True)
+        self._thread.start()
+
+    def _consume(self):
+        while True:
+            batch = self._queue.get()
+            if batch is self._SENTINEL:
+                return
+            # 合并队列中已就绪的其他块列表，一并向量化
+            done = False
+            while True:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is self._SENTINEL:
+                    done = True
+                    break
+                batch.extend(more)
+            # 出错后继续取空队列，避免生产者在 put 上永久阻塞
+            if self._error is None:
+                try:
+                    self.vector_store.save_blocks(batch)
+                except BaseException as e:
+                    self._error = e
+            if done:
+                return
+
+    def submit(self, blocks: List[ParsedBlock]):
+        """提交一个文件的块列表，累积到 min_blocks 个后入队"""
+        self._pending.extend(blocks)
+        if len(self._pending) >= self.min_blocks:
+            self._queue.put(self._pending)
+            self._pending = []
+
+    def close(self, reraise: bool = True):
+        """
+        提交剩余的块，发送结束标记并等待消费者处理完毕。
+        reraise 为 True 时消费过程中的异常在调用线程重新抛出；
+        为 False 时（调用方已有异常在传播）只记录日志，不覆盖原异常
+        """
+        if self._pending:
+            self._queue.put(self._pending)
+            self._pending = []
+        self._queue.put(self._SENTINEL)
+        self._thread.join()
+        if self._error is not None:
+            if reraise:
+                raise self._error
+            self.logger.error("Vectorization failed", exc_info=self._error)
+
+
+def _run(parser_pipeline: MarkdownParserPipeline, vector_store: VectorStoreConnector,
+         file_paths: List[str], output_json: bool, jsonl: bool, vectorize: bool) -> List[ParsedBlock]:
     """
-    # 初始化日志
+    解析文件并（可选）向量化：解析完成的块按批交给后台线程向量化，
+    解析结束后保存 JSON，最后等待向量化完成
+    """
+    config = ConfigManager()
+    logger = get_logger('tag_rag.main')
+
+    vectorizer = None
+    if vectorize:
+        # 模块二消费
+        logger.info("Running Module 2: Vectorizing...")
+        vectorizer = BackgroundVectorizer(vector_store)
+
+    blocks: List[ParsedBlock] = []
+    try:
+        for _, file_blocks in parser_pipeline.iter_files(*file_paths):
+            blocks.extend(file_blocks)
+            if vectorizer is not None:
+                vectorizer.submit(file_blocks)
+
+        logger.info(f"Generated {len(blocks)} blocks in total.")
+
+        # 保存中间结果 (可选，方便调试)
+        if output_json:
+            out_path = save_blocks_json(blocks, config.output_dir, jsonl=jsonl)
+            logger.info(f"Intermediate result saved to {out_path}")
+    except BaseException:
+        # 解析/保存阶段的异常优先向上传播，向量化线程的异常只记录日志
+        if vectorizer is not None:
+            vectorizer.close(reraise=False)
+        raise
+    if vectorizer is not None:
+        vectorizer.close()
+
+    logger.info("Done.")
+    return blocks
+
+
+def _init() -> tuple:
+    """初始化日志并实例化两个模块"""
     config = ConfigManager()
     configure_logging({
         'level': config.log_level,
         'format': config.log_format,
-        'handlers': config.log_handlers
+        'handlers': config.log_handlers,
+        'queue_max_size': config.log_queue_max_size
     })
     logger = get_logger('tag_rag.main')
     
@@ -42,81 +195,54 @@ def process_files(*file_paths: str, output_json: bool = True) -> List[dict]:
     
     # 实例化模块二 (向量存储连接器)
     vector_store = VectorStoreConnector()
+    return config, logger, parser_pipeline, vector_store
+
+
+def process_files(*file_paths: str, output_json: bool = True, jsonl: bool = False) -> List[dict]:
+    """
+    抽象方法：处理可变数量的文件，返回解析后的块字典列表
+    
+    Args:
+        *file_paths: 可变数量的文件路径
+        output_json: 是否将结果保存为JSON文件
+        jsonl: 是否以 JSON Lines 格式保存（每行一个块）
+        
+    Returns:
+        List[dict]: 所有文件的块字典列表
+    """
+    config, logger, parser_pipeline, vector_store = _init()
 
     if not file_paths:
         # 如果没有提供文件路径，则处理配置目录下的所有文件
         logger.info(f"No files specified, processing directory: {config.input_dir}")
-        blocks = parser_pipeline.process_directory()
+        file_paths = parser_pipeline.collect_files()
     else:
         # 处理指定的文件列表
         logger.info(f"Processing {len(file_paths)} specified file(s)...")
-        blocks = parser_pipeline.process_files(*file_paths)
-    
-    logger.info(f"Generated {len(blocks)} blocks in total.")
     
-    # 保存中间结果 (可选，方便调试)
-    if output_json:
-        os.makedirs(config.output_dir, exist_ok=True)
-        out_path = os.path.join(config.output_dir, "parsed_result.json")
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump([asdict(b) for b in blocks], f, ensure_ascii=False, indent=2)
-        logger.info(f"Intermediate result saved to {out_path}")
-    
-    # 模块二消费
-    logger.info("Running Module 2: Vectorizing...")
-    vector_store.save_blocks(blocks)
-    
-    logger.info("Done.")
-    return [asdict(b) for b in blocks]
+    blocks = _run(parser_pipeline, vector_store, list(file_paths), output_json, jsonl, vectorize=True)
+    return [block_to_dict(b) for b in blocks]
 
 
-def process_directory(directory_path: str = None, output_json: bool = True) -> List[dict]:
+def process_directory(directory_path: str = None, output_json: bool = True, jsonl: bool = False) -> List[dict]:
     """
     处理指定目录下的所有文件（根据配置的后缀白名单）
     
     Args:
         directory_path: 目录路径，如果为None则使用配置中的input_dir
         output_json: 是否将结果保存为JSON文件
+        jsonl: 是否以 JSON Lines 格式保存（每行一个块）
         
     Returns:
         List[dict]: 所有文件的块字典列表
     """
-    # 初始化日志
-    config = ConfigManager()
-    configure_logging({
-        'level': config.log_level,
-        'format': config.log_format,
-        'handlers': config.log_handlers
-    })
-    logger = get_logger('tag_rag.main')
-    
-    logger.info("System Initializing...")
-    
-    # 实例化模块一 (解析管道)
-    parser_pipeline = MarkdownParserPipeline()
-    
-    # 实例化模块二 (向量存储连接器)
-    vector_store = VectorStoreConnector()
+    config, logger, parser_pipeline, vector_store = _init()
 
     logger.info(f"Processing directory: {directory_path or config.input_dir}")
-    blocks = parser_pipeline.process_directory(directory_path)
-    
-    logger.info(f"Generated {len(blocks)} blocks in total.")
-    
-    # 保存中间结果 (可选，方便调试)
-    if output_json:
-        os.makedirs(config.output_dir, exist_ok=True)
-        out_path = os.path.join(config.output_dir, "parsed_result.json")
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump([asdict(b) for b in blocks], f, ensure_ascii=False, indent=2)
-        logger.info(f"Intermediate result saved to {out_path}")
+    file_paths = parser_pipeline.collect_files(directory_path)
     
-    # 模块二消费
-    logger.info("Running Module 2: Vectorizing...")
-    vector_store.save_blocks(blocks)
-    
-    logger.info("Done.")
-    return [asdict(b) for b in blocks]
+    blocks = _run(parser_pipeline, vector_store, file_paths, output_json, jsonl, vectorize=True)
+    return [block_to_dict(b) for b in blocks]
 
 
 def main():
@@ -125,59 +251,29 @@ def main():
     parser.add_argument('files', nargs='*', help='Markdown files to process (if none, process all files in config.input_dir)')
     parser.add_argument('--dir', help='Directory to process (overrides config.input_dir)')
     parser.add_argument('--no-json', action='store_true', help='Do not save JSON output')
+    parser.add_argument('--jsonl', action='store_true', help='Save output as JSON Lines (one block per line)')
     parser.add_argument('--no-vectorize', action='store_true', help='Do not vectorize blocks')
     
     args = parser.parse_args()
     
-    # 初始化日志
-    config = ConfigManager()
-    configure_logging({
-        'level': config.log_level,
-        'format': config.log_format,
-        'handlers': config.log_handlers
-    })
-    logger = get_logger('tag_rag.main')
-    
-    logger.info("System Initializing...")
-    
-    # 实例化模块一 (解析管道)
-    parser_pipeline = MarkdownParserPipeline()
-    
-    # 实例化模块二 (向量存储连接器)
-    vector_store = VectorStoreConnector()
-
-    blocks = []
+    config, logger, parser_pipeline, vector_store = _init()
     
     # 确定要处理的文件
     if args.dir:
         # 处理指定目录
         logger.info(f"Processing directory: {args.dir}")
-        blocks = parser_pipeline.process_directory(args.dir)
+        file_paths = parser_pipeline.collect_files(args.dir)
     elif args.files:
         # 处理指定的文件列表
         logger.info(f"Processing {len(args.files)} specified file(s)...")
-        blocks = parser_pipeline.process_files(*args.files)
+        file_paths = args.files
     else:
         # 默认处理配置目录下的所有文件
         logger.info(f"No files specified, processing directory: {config.input_dir}")
-        blocks = parser_pipeline.process_directory()
+        file_paths = parser_pipeline.collect_files()
     
-    logger.info(f"Generated {len(blocks)} blocks in total.")
-    
-    # 保存中间结果 (可选，方便调试)
-    if not args.no_json:
-        os.makedirs(config.output_dir, exist_ok=True)
-        out_path = os.path.join(config.output_dir, "parsed_result.json")
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump([asdict(b) for b in blocks], f, ensure_ascii=False, indent=2)
-        logger.info(f"Intermediate result saved to {out_path}")
-    
-    # 模块二消费
-    if not args.no_vectorize:
-        logger.info("Running Module 2: Vectorizing...")
-        vector_store.save_blocks(blocks)
-    
-    logger.info("Done.")
+    _run(parser_pipeline, vector_store, file_paths,
+         output_json=not args.no_json, jsonl=args.jsonl, vectorize=not args.no_vectorize)
 
 
 if __name__ == "__main__":
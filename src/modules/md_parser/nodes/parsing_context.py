@@ -1,4 +1,5 @@
-from typing import List, Dict, Optional
+from itertools import chain
+from typing import List, Dict, Optional, Tuple
 from src.common.types import Tag
 from src.modules.md_parser.nodes.row_parser import Row
 
@@ -12,17 +13,35 @@ class ParsingContext:
     作用域标签同样使用0~6，0代表文档，1~6代表H1~H6。
     """
 
+    # 每行都会多次访问上下文属性，使用 __slots__ 固定属性布局（无 __dict__，访问更快、占用更小）
+    __slots__ = (
+        'heading_stack', 'current_lvl', 'scope_tags',
+        'current_buffer', '_buffer_chars', '_buffer_nonblank_rows',
+        'protected_element_groups', 'current_protected_element_id', 'current_protected_type',
+        'in_code_block', 'in_table_block', 'is_splited_since_last_header',
+        '_active_tags_cache', '_header_path', '_title_tag', 'file_tag',
+    )
+
     def __init__(self):
         # 标题栈，索引0为文档级别（None），索引1~6对应H1~H6
         # 例如：heading_stack[1] 存储H1标题文本，heading_stack[2] 存储H2标题文本
         self.heading_stack: List[Optional[str]] = [None] * 7  # 0~6
 
-        # 作用域标签，key为级别（0=文档，1=H1，...，6=H6）
-        self.scope_tags: Dict[int, List[Tag]] = {i: [] for i in range(7)}  # 0~6
+        # 当前标题级别：heading_stack 中最大的非None索引（0表示尚无标题），随标题栈变更增量维护
+        self.current_lvl: int = 0
+
+        # 作用域标签，索引为级别（0=文档，1=H1，...，6=H6），定长列表直接按索引访问
+        self.scope_tags: List[List[Tag]] = [[] for _ in range(7)]  # 0~6
 
         # 当前缓冲区，存放尚未形成块的普通行
         self.current_buffer: List[Row] = []
 
+        # 缓冲区中文本的总字符数，随缓冲区增删增量维护
+        self._buffer_chars: int = 0
+
+        # 缓冲区中非空白行的数量，随缓冲区增删增量维护
+        self._buffer_nonblank_rows: int = 0
+
         # 保护元素分组，key为元素ID，value为该元素包含的所有行
         self.protected_element_groups: Dict[str, List[Row]] = {}
 
@@ -41,6 +60,18 @@ class ParsingContext:
         # 状态：自上标题行后是否发生过非标题行切块
         self.is_splited_since_last_header: bool = False
 
+        # 有效标签的缓存，仅在标题栈或作用域标签变更时失效
+        self._active_tags_cache: Optional[Tuple[Tag, ...]] = None
+
+        # 标题路径字符串，仅在标题栈变更时重建，读取时直接返回
+        self._header_path: str = ""
+
+        # 标题路径对应的 title 标签，随标题路径失效，首次使用时创建，同一路径下的块共享同一实例
+        self._title_tag: Optional[Tag] = None
+
+        # 当前文件的 file_path 标签，由调用方在开始解析文件时设置一次，所有块共享
+        self.file_tag: Optional[Tag] = None
+
     def reset_on_new_header(self, header_level: int):
         """
         当遇到新标题时，清除当前级别及更深级别的标签。
@@ -48,23 +79,39 @@ class ParsingContext:
         """
         # 清除当前级别及更深级别的旧标签（级别1~6）
         for i in range(header_level, 7):
-            self.scope_tags[i] = []
+            self.scope_tags[i].clear()
 
         # 注意：标题栈不需要调整大小，因为已经固定长度为7
         # 但需要清除当前级别及更深级别的标题文本
         for i in range(header_level, 7):
             self.heading_stack[i] = None
 
+        # 清除后当前级别必定低于header_level，向下查找仍存在的最深标题
+        if self.current_lvl >= header_level:
+            lvl = header_level - 1
+            while lvl > 0 and self.heading_stack[lvl] is None:
+                lvl -= 1
+            self.current_lvl = lvl
+        self._active_tags_cache = None
+        self._header_path = self._build_header_path()
+        self._title_tag = None
+
     def set_heading_text(self, header_level: int, text: str):
         """设置当前级别标题文本，header_level为1~6"""
         self.heading_stack[header_level] = text
+        if header_level > self.current_lvl:
+            self.current_lvl = header_level
+        self._active_tags_cache = None
+        self._header_path = self._build_header_path()
+        self._title_tag = None
 
     def add_tag(self, tag: Tag, level: int):
         """添加标签到指定级别，level为0~6"""
-        if level in self.scope_tags:
+        if 0 <= level < 7:
             self.scope_tags[level].append(tag)
+            self._active_tags_cache = None
 
-    def enter_protected_element(self, element_id: str, element_type: str, start_index: int):
+    def enter_protected_element(self, element_id: str, element_type: str):
         """进入保护元素区域"""
         self.current_protected_element_id = element_id
         self.current_protected_type = element_type
@@ -94,27 +141,30 @@ class ParsingContext:
         """是否处于保护元素内部"""
         return self.current_protected_element_id is not None
 
-    def get_active_tags(self) -> List[Tag]:
-        """收集所有当前有效的标签（继承逻辑）"""
-        active_tags = []
-        # 确定当前标题级别：找到最大的非None标题索引
-        current_lvl = 0
-        for i in range(1, 7):
-            if self.heading_stack[i] is not None:
-                current_lvl = i
-        # 遍历所有父级，收集标签（包括文档级别0）
-        for i in range(0, current_lvl + 1):
-            if i in self.scope_tags:
-                active_tags.extend(self.scope_tags[i])
-        return active_tags
+    def get_active_tags(self) -> Tuple[Tag, ...]:
+        """
+        收集所有当前有效的标签（继承逻辑）
+        返回缓存的不可变元组，需要追加标签的调用方应自行复制
+        """
+        if self._active_tags_cache is None:
+            # 按级别顺序拼接所有父级的标签（包括文档级别0）
+            self._active_tags_cache = tuple(chain.from_iterable(self.scope_tags[:self.current_lvl + 1]))
+        return self._active_tags_cache
 
     def get_header_path(self) -> str:
         """生成标题路径字符串，空层级标记为null，忽略索引0（文档级别）"""
-        # 找到最大的非None标题级别
-        current_lvl = 0
-        for i in range(1, 7):
-            if self.heading_stack[i] is not None:
-                current_lvl = i
+        return self._header_path
+
+    def get_title_tag(self) -> Optional[Tag]:
+        """当前标题路径对应的 title 标签，无标题时返回 None"""
+        if self._title_tag is None and self._header_path:
+            header_path = self._header_path
+            self._title_tag = Tag(key="title", value=header_path, original_text=f"#title/{header_path}")
+        return self._title_tag
+
+    def _build_header_path(self) -> str:
+        """根据标题栈构建标题路径"""
+        current_lvl = self.current_lvl
         
         # 如果没有标题，返回空字符串
         if current_lvl == 0:
@@ -132,21 +182,34 @@ class ParsingContext:
 
     def flush_buffer(self) -> List[Row]:
         """清空当前缓冲区并返回内容，用于生成块"""
-        buffer = self.current_buffer.copy()
-        self.current_buffer.clear()
+        # 直接交出列表所有权并换上新列表，避免逐元素复制
+        buffer = self.current_buffer
+        self.current_buffer = []
+        self._buffer_chars = 0
+        self._buffer_nonblank_rows = 0
         return buffer
 
     def clear_buffer(self):
         """清空缓冲区但不返回内容"""
         self.current_buffer.clear()
+        self._buffer_chars = 0
+        self._buffer_nonblank_rows = 0
 
     def append_to_buffer(self, row: Row):
         """将行添加到缓冲区"""
         self.current_buffer.append(row)
+        self._buffer_chars += len(row.text)
+        if not row.is_blank:
+            self._buffer_nonblank_rows += 1
+
+    @property
+    def has_nonblank_buffer(self) -> bool:
+        """缓冲区中是否有非空白行（只有空白行时切块必然不产生块）"""
+        return self._buffer_nonblank_rows > 0
 
     def buffer_length(self) -> int:
-        """计算缓冲区中文本的总字符数"""
-        return sum(len(r.text) for r in self.current_buffer)
+        """缓冲区中文本的总字符数"""
+        return self._buffer_chars
 
     def get_protected_element_rows(self, element_id: str) -> List[Row]:
         """获取指定保护元素ID的所有行"""
@@ -1,53 +1,65 @@
 import re
 from dataclasses import dataclass
+from typing import Iterable, Iterator
 
-@dataclass
+# 行类型（互斥），解析时确定一次，构建阶段按整数分派
+ROW_CONTENT = 0     # 普通内容行
+ROW_HEADER = 1      # 标题行
+ROW_TAG = 2         # 独占一行的标签
+ROW_CODE_FENCE = 3  # 代码围栏（``` 或 ~~~）
+ROW_TABLE = 4       # 表格行
+
+@dataclass(slots=True)
 class Row:
     index: int
     text: str
     clean_text: str
-    is_header: bool = False
+    kind: int = ROW_CONTENT
     header_level: int = 0
-    is_tag: bool = False
-    is_code_fence: bool = False
-    is_table: bool = False  # 新增：表格行识别
+    is_blank: bool = False  # 整行为空或只包含空白字符
 
 class RowParserNode:
     """节点功能：单行文本解析"""
     
-    RE_HEADER = re.compile(r'^(#{1,6})\s+(.*)')
-    RE_TAG = re.compile(r'^\s*(#[^#\s]+)\s*$') # 简单标签匹配
-    RE_FENCE = re.compile(r'^\s*(`{3,}|~{3,})')
-    RE_TABLE_ROW = re.compile(r'^\s*\|.*\|\s*$')  # 匹配表格行：以|开头和结尾
+    # 单个交替正则完成整行分类（作用于 strip 后的文本），一次 C 层匹配代替多次 re.match
+    # 分支顺序即优先级：代码围栏 > 标题 > 独占一行的标签 > 表格行
+    RE_ROW = re.compile(
+        r'^(?:(?P<fence>`{3,}|~{3,})'
+        r'|(?P<header>(?P<hashes>#{1,6})\s+(?P<htext>.*))'
+        r'|(?P<tag>#[^#\s]+$)'  # 简单标签匹配
+        r'|(?P<table>\|.*\|$))'  # 匹配表格行：以|开头和结尾
+    )
+
+    # 只有以这些字符开头的行才可能命中 RE_ROW，其余普通内容行（绝大多数）无需进入正则引擎
+    MARKER_CHARS = frozenset('`~#|')
 
-    def process(self, raw_lines: list[str]) -> list[Row]:
-        result = []
+    def process(self, raw_lines: Iterable[str]) -> Iterator[Row]:
+        """逐行解析并产出 Row，可直接传入文件对象，无需先将整个文件读入列表"""
+        match_row = self.RE_ROW.match
+        marker_chars = self.MARKER_CHARS
         for idx, line in enumerate(raw_lines):
             clean = line.strip()
-            row = Row(index=idx, text=line, clean_text=clean)
-            
-            # 识别 Code Fence (仅标记边界行，不跟踪状态)
-            if self.RE_FENCE.match(line):
-                row.is_code_fence = True
-                result.append(row)
-                continue
+            row = Row(index=idx, text=line, clean_text=clean, is_blank=not clean)
 
-            # 识别 Header
-            h_match = self.RE_HEADER.match(clean)
-            if h_match:
-                row.is_header = True
-                row.header_level = len(h_match.group(1))
-                row.clean_text = h_match.group(2).strip()
-                result.append(row)
+            if not clean or clean[0] not in marker_chars:
+                yield row
                 continue
-
-            # 识别 独占一行的Tag
-            if self.RE_TAG.match(clean):
-                row.is_tag = True
-            
-            # 识别表格行
-            if self.RE_TABLE_ROW.match(clean):
-                row.is_table = True
-            
-            result.append(row)
-        return result
+            m = match_row(clean)
+            if m is None:
+                yield row
+                continue
+            kind = m.lastgroup
+            if kind == 'fence':
+                # 识别 Code Fence (仅标记边界行，不跟踪状态)
+                row.kind = ROW_CODE_FENCE
+            elif kind == 'header':
+                row.kind = ROW_HEADER
+                row.header_level = len(m.group('hashes'))
+                row.clean_text = m.group('htext').strip()
+            elif kind == 'tag':
+                # 识别 独占一行的Tag
+                row.kind = ROW_TAG
+            else:
+                # 识别表格行
+                row.kind = ROW_TABLE
+            yield row
@@ -1,11 +1,17 @@
 import hashlib
-from typing import List, Optional
+import re
+from typing import Iterable, List, Optional, Tuple
 from src.common.types import ParsedBlock, Tag
-from src.modules.md_parser.nodes.row_parser import Row
+from src.modules.md_parser.nodes.row_parser import (
+    Row, ROW_HEADER, ROW_TAG, ROW_CODE_FENCE, ROW_TABLE
+)
 from src.modules.md_parser.nodes.tag_extractor import TagExtractorNode
 from src.modules.md_parser.nodes.parsing_context import ParsingContext
 from src.modules.md_parser.nodes.special_chunker import SpecialChunker
 
+# 标题行：1-6个#后紧跟空格（行已strip，空格后必有文本）
+_HEADING_ONLY_RE = re.compile(r'#{1,6} ')
+
 
 class ScopeBuilderNode:
     """节点功能：使用上下文状态机维护文档结构，生成最终块，实现保护元素优先切块策略"""
@@ -15,6 +21,18 @@ class ScopeBuilderNode:
         self.tag_node = tag_node
         self.special_chunker = SpecialChunker(config)
 
+    @staticmethod
+    def _block_id(file_path: str, rows: List[Row], text: str) -> str:
+        """
+        生成跨文件唯一的block_id：文件路径、首尾行号（整数行索引，以\0分隔）与内容
+        送入同一个 BLAKE2b-128，一次哈希即可，十六进制长度与原 MD5 相同（32位）
+        """
+        # 仅用于生成ID而非安全用途，显式声明以免在 FIPS 模式的 OpenSSL 构建下被拦截或走合规包装
+        h = hashlib.blake2b(f"{file_path}\0{rows[0].index}\0{rows[-1].index}\0".encode(),
+                            digest_size=16, usedforsecurity=False)
+        h.update(text.encode())
+        return h.hexdigest()
+
     def _should_discard_block(self, text: str) -> bool:
         """
         判断是否应舍弃该块：内容仅包含标题行（以1-6个#开头，后跟空格和文本）
@@ -23,46 +41,57 @@ class ScopeBuilderNode:
         lines = text.strip().splitlines()
         if not lines:
             return True  # 空内容
-        # 检查每一行是否都是标题行（允许前后有空行，但已strip）
-        for line in lines:
-            stripped = line.strip()
-            # 标题行模式：以1-6个#开头，后跟至少一个空格，然后有非空文本
-            if not (stripped.startswith('#') and ' ' in stripped):
-                return False  # 非标题行，保留块
-            # 验证#数量在1-6之间（标题级别）
-            hash_count = 0
-            for char in stripped:
-                if char == '#':
-                    hash_count += 1
-                else:
-                    break
-            if hash_count < 1 or hash_count > 6 or stripped[hash_count] != ' ':
-                return False  # 不符合标题格式，保留块
-        # 所有行都是标题行，舍弃
-        return True
+        # 所有行（strip后）都是标题行才舍弃；空行不匹配，视为实质内容而保留块
+        match = _HEADING_ONLY_RE.match
+        return all(match(line.strip()) for line in lines)
 
-    def run(self, rows: List[Row], file_path: str) -> List[ParsedBlock]:
+    def run(self, rows: Iterable[Row], file_path: str) -> List[ParsedBlock]:
+        """
+        按顺序消费行并生成块。rows 可以是任意迭代器（如逐行解析的生成器），
+        只需向前预读一行用于判断表格结束
+        """
         blocks = []
         context = ParsingContext()
-
-        i = 0
-        while i < len(rows):
-            row = rows[i]
+        # 添加 file_path 作为 tag（每个文件只创建一次）
+        context.file_tag = Tag(key="file_path", value=file_path, original_text=f"#file_path/{file_path}")
+
+        # row 为当前待处理行，None 表示输入结束；前进一行即 row = advance()
+        next_row = iter(rows).__next__
+        def advance() -> Optional[Row]:
+            try:
+                return next_row()
+            except StopIteration:
+                return None
+
+        # 循环内频繁使用的配置与方法提前绑定为局部变量
+        max_chars = self.config.chunk_max_chars
+        overlap = self.config.chunk_overlap
+        extract_tag = self.tag_node.extract_from_text
+        append_block = blocks.append
+        extend_blocks = blocks.extend
+        append_to_buffer = context.append_to_buffer
+        add_to_protected = context.add_row_to_protected_element
+        in_protected = context.is_in_protected_element
+        flush_buffer = self._flush_buffer
+        flush_protected = self._flush_protected_element
+
+        row = advance()
+        while row is not None:
+            kind = row.kind
 
             # 1. 如果是标题，触发切分（包括当前缓冲区中的保护元素）
-            if row.is_header:
+            if kind == ROW_HEADER:
                 # 先切分当前缓冲区（如果有内容）
-                if context.current_buffer or context.is_in_protected_element():
+                if context.current_buffer or in_protected():
                     # 如果有保护元素，先切分保护元素
-                    if context.is_in_protected_element():
+                    if in_protected():
                         # 退出保护元素并切块
-                        protected_blocks = self._flush_protected_element(context, file_path)
-                        for block in protected_blocks:
-                            blocks.append(block)
-                    # 再切分普通缓冲区
-                    block = self._flush_buffer(context, file_path)
-                    if block:
-                        blocks.append(block)
+                        extend_blocks(flush_protected(context, file_path))
+                    # 再切分普通缓冲区（只有空白行时无需切块，下方会直接清空）
+                    if context.has_nonblank_buffer:
+                        block = flush_buffer(context, file_path)
+                        if block:
+                            append_block(block)
 
                 # 重置is_splited状态，因为新标题开始了新的逻辑单元
                 context.is_splited_since_last_header = False
@@ -74,103 +103,101 @@ class ScopeBuilderNode:
 
                 # 标题行本身作为新缓冲区的开始
                 context.clear_buffer()
-                context.append_to_buffer(row)
-                i += 1
+                append_to_buffer(row)
+                row = advance()
                 continue
 
             # 2. 如果是标签行
-            if row.is_tag:
-                # 确定标签级别：当前标题级别
-                current_lvl = 0
-                for idx in range(1, 7):
-                    if context.heading_stack[idx] is not None:
-                        current_lvl = idx
-                tag = self.tag_node.extract_from_text(row.clean_text)
+            if kind == ROW_TAG:
+                # 确定标签级别：当前标题级别（上下文增量维护，无需扫描标题栈）
+                tag = extract_tag(row.clean_text)
                 if tag:
-                    context.add_tag(tag, current_lvl)
-                i += 1
+                    context.add_tag(tag, context.current_lvl)
+                row = advance()
                 continue
 
             # 3. 检测代码块边界
-            if row.is_code_fence:
+            if kind == ROW_CODE_FENCE:
                 # 在进入代码块之前，先切分当前缓冲区（如果有内容）
                 if not context.in_code_block and context.current_buffer:
                     # 非标题行切块，设置状态
                     context.is_splited_since_last_header = True
-                    block = self._flush_buffer(context, file_path)
-                    if block:
-                        blocks.append(block)
+                    if context.has_nonblank_buffer:
+                        block = flush_buffer(context, file_path)
+                        if block:
+                            append_block(block)
+                    else:
+                        # 只有空白行，切块必然为空，直接清空缓冲区
+                        context.clear_buffer()
                 
                 if not context.in_code_block:
                     # 进入代码块保护元素
                     element_id = f"code_{row.index}"
-                    context.enter_protected_element(element_id, 'code', row.index)
-                    context.add_row_to_protected_element(row)
+                    context.enter_protected_element(element_id, 'code')
+                    add_to_protected(row)
                 else:
                     # 退出代码块保护元素
-                    context.add_row_to_protected_element(row)
+                    add_to_protected(row)
                     context.is_splited_since_last_header = True
-                    protected_blocks = self._flush_protected_element(context, file_path)
-                    for block in protected_blocks:
-                        blocks.append(block)
+                    extend_blocks(flush_protected(context, file_path))
                     context.exit_protected_element()
-                i += 1
+                row = advance()
                 continue
 
             # 4. 检测表格行
-            if row.is_table:
+            if kind == ROW_TABLE:
                 # 在进入表格之前，先切分当前缓冲区（如果有内容）
                 if not context.in_table_block and context.current_buffer:
                     # 非标题行切块，设置状态
                     context.is_splited_since_last_header = True
-                    block = self._flush_buffer(context, file_path)
-                    if block:
-                        blocks.append(block)
+                    if context.has_nonblank_buffer:
+                        block = flush_buffer(context, file_path)
+                        if block:
+                            append_block(block)
+                    else:
+                        # 只有空白行，切块必然为空，直接清空缓冲区
+                        context.clear_buffer()
                 
                 # 如果当前不在表格保护元素中，则进入新的表格保护元素
                 if not context.in_table_block:
                     element_id = f"table_{row.index}"
-                    context.enter_protected_element(element_id, 'table', row.index)
-                context.add_row_to_protected_element(row)
-                i += 1
+                    context.enter_protected_element(element_id, 'table')
+                add_to_protected(row)
+                row = advance()
                 # 检查下一行是否仍然是表格行，如果不是则退出表格保护元素
-                if i < len(rows) and not rows[i].is_table:
+                if row is not None and row.kind != ROW_TABLE:
                     context.is_splited_since_last_header = True
-                    protected_blocks = self._flush_protected_element(context, file_path)
-                    for block in protected_blocks:
-                        blocks.append(block)
+                    extend_blocks(flush_protected(context, file_path))
                     context.exit_protected_element()
                 continue
 
             # 5. 如果当前处于保护元素内部（代码块或表格内部行）
-            if context.is_in_protected_element():
-                context.add_row_to_protected_element(row)
-                i += 1
+            if in_protected():
+                add_to_protected(row)
+                row = advance()
                 continue
 
             # 6. 普通内容行
-            context.append_to_buffer(row)
+            append_to_buffer(row)
 
             # 7. 检查缓冲区是否超长
-            current_len = context.buffer_length()
-            if current_len > self.config.chunk_max_chars:
+            if context.buffer_length() > max_chars:
                 # 超长切块，属于非标题行切块，设置状态
                 context.is_splited_since_last_header = True
-                block = self._flush_buffer(context, file_path)
+                block = flush_buffer(context, file_path)
                 if block:
-                    blocks.append(block)
+                    append_block(block)
                 # 保留重叠行
-                overlap = self.config.chunk_overlap
                 if overlap > 0:
                     # 从当前缓冲区中保留最后overlap行
                     buffer_rows = context.flush_buffer()
                     keep_rows = buffer_rows[-overlap:] if len(buffer_rows) >= overlap else buffer_rows
                     for r in keep_rows:
-                        context.append_to_buffer(r)
+                        append_to_buffer(r)
                 else:
                     context.clear_buffer()
             else:
-                i += 1
+                row = advance()
 
         # 收尾处理：处理剩余的保护元素和缓冲区
         if context.is_in_protected_element():
@@ -186,22 +213,37 @@ class ScopeBuilderNode:
 
         return blocks
 
+    @staticmethod
+    def _block_tags(context: ParsingContext) -> Tuple[Tag, ...]:
+        """
+        生成块的标签元组：继承的有效标签（上下文缓存的元组，直接共享）+ file_path 标签 + title 标签
+        Tag 不可变，file_path 标签每个文件只创建一次，title 标签每个标题路径只创建一次
+        """
+        # 如果 header_path 非空，添加 title tag
+        title_tag = context.get_title_tag()
+        if title_tag is not None:
+            return context.get_active_tags() + (context.file_tag, title_tag)
+        return context.get_active_tags() + (context.file_tag,)
+
     def _flush_buffer(self, context: ParsingContext, file_path: str) -> Optional[ParsedBlock]:
         """将当前缓冲区中的行切分为一个块"""
         rows = context.flush_buffer()
         if not rows:
             return None
 
-        # 去除首尾的空行（整行为空或只包含空白字符）
-        while rows and rows[0].text.strip() == "":
-            rows.pop(0)
-        while rows and rows[-1].text.strip() == "":
-            rows.pop(-1)
+        # 去除首尾的空行（整行为空或只包含空白字符），移动首尾游标后一次切片
+        lo, hi = 0, len(rows)
+        while lo < hi and rows[lo].is_blank:
+            lo += 1
+        while hi > lo and rows[hi - 1].is_blank:
+            hi -= 1
 
-        if not rows:
+        if lo == hi:
             return None
+        if lo or hi < len(rows):
+            rows = rows[lo:hi]
 
-        text = "".join(r.text for r in rows).strip()
+        text = "".join([r.text for r in rows]).strip()
         if not text:
             return None
 
@@ -209,21 +251,10 @@ class ScopeBuilderNode:
         if self._should_discard_block(text):
             return None
 
-        active_tags = context.get_active_tags()
-        header_path = context.get_header_path()
-
-        # 添加 file_path 作为 tag
-        file_tag = Tag(key="file_path", value=file_path, original_text=f"#file_path/{file_path}")
-        active_tags.append(file_tag)
-        
-        # 如果 header_path 非空，添加 title tag
-        if header_path:
-            title_tag = Tag(key="title", value=header_path, original_text=f"#title/{header_path}")
-            active_tags.append(title_tag)
+        active_tags = self._block_tags(context)
 
         # 生成跨文件唯一的block_id
-        base_content_hash = hashlib.md5(text.encode()).hexdigest()[:16]
-        bid = hashlib.md5(f"{file_path}_{rows[0].index}_{rows[-1].index}_{base_content_hash}".encode()).hexdigest()
+        bid = self._block_id(file_path, rows, text)
 
         # 行号转换为1-based（文件行号）
         start_line = rows[0].index + 1
@@ -234,7 +265,7 @@ class ScopeBuilderNode:
             content=text,
             start_line=start_line,
             end_line=end_line,
-            tags=list(active_tags),
+            tags=active_tags,
             is_splited=context.is_splited_since_last_header,
             protected_element_type=None,  # 普通块没有保护元素类型
             protected_element_overlength=False  # 普通块没有保护元素超长
@@ -249,24 +280,16 @@ class ScopeBuilderNode:
         if not rows:
             return []
 
-        text = "".join(r.text for r in rows).strip()
+        # 行文本只收集一次，拼接与长度统计共用
+        texts = [r.text for r in rows]
+        text = "".join(texts).strip()
         if not text:
             return []
 
-        active_tags = context.get_active_tags()
-        header_path = context.get_header_path()
-
-        # 添加 file_path 作为 tag
-        file_tag = Tag(key="file_path", value=file_path, original_text=f"#file_path/{file_path}")
-        active_tags.append(file_tag)
-        
-        # 如果 header_path 非空，添加 title tag
-        if header_path:
-            title_tag = Tag(key="title", value=header_path, original_text=f"#title/{header_path}")
-            active_tags.append(title_tag)
+        active_tags = self._block_tags(context)
 
         # 检查保护元素是否单独超长
-        element_len = sum(len(r.text) for r in rows)
+        element_len = sum(map(len, texts))
         is_splited = context.is_splited_since_last_header
         protected_element_overlength = element_len > self.config.chunk_max_chars
 
@@ -275,8 +298,7 @@ class ScopeBuilderNode:
         end_line = rows[-1].index + 1
 
         # 生成基础ID（跨文件唯一）
-        base_content_hash = hashlib.md5(text.encode()).hexdigest()[:16]
-        base_id = hashlib.md5(f"{file_path}_{start_line}_{end_line}_{base_content_hash}".encode()).hexdigest()
+        base_id = self._block_id(file_path, rows, text)
 
         if not protected_element_overlength:
             # 未超长，返回单个块
@@ -285,7 +307,7 @@ class ScopeBuilderNode:
                 content=text,
                 start_line=start_line,
                 end_line=end_line,
-                tags=list(active_tags),
+                tags=active_tags,
                 is_splited=is_splited,
                 protected_element_type=context.current_protected_type,
                 protected_element_overlength=False
@@ -1,7 +1,17 @@
+import bisect
 import re
 from typing import List, Tuple
 from src.common.types import Tag
 
+# 按 '\n' 拆分并保留换行符（与 split('\n') 一一对应）；不用 splitlines，
+# 因为它还会在 \x0c、\u2028 等字符处断行
+_LINE_RE = re.compile(r'[^\n]*\n')
+
+
+def _split_lines_keepends(content: str) -> List[str]:
+    """拆分为每行都带换行符的列表：末行补一个换行符，使各行长度统一为原行长加一"""
+    return _LINE_RE.findall(content + '\n')
+
 class SpecialChunker:
     """
     特殊切块器：用于处理超长的保护元素（代码块、表格）
@@ -14,19 +24,19 @@ class SpecialChunker:
     def chunk_protected_element(self, 
                                element_type: str, 
                                content: str, 
-                               original_tags: List[Tag],
-                               max_chars: int = None) -> List[Tuple[str, List[Tag]]]:
+                               original_tags: Tuple[Tag, ...],
+                               max_chars: int = None) -> List[Tuple[str, Tuple[Tag, ...]]]:
         """
         将超长保护元素拆分为多个子块
         
         Args:
             element_type: 'code' 或 'table'
             content: 保护元素的原始文本内容
-            original_tags: 原始块的标签列表
+            original_tags: 原始块的标签元组（不可变，各子块直接共享）
             max_chars: 最大字符数（如果为None则使用配置的chunk_max_chars）
             
         Returns:
-            List[Tuple[str, List[Tag]]]: 每个子块的（内容, 标签列表）元组列表
+            List[Tuple[str, Tuple[Tag, ...]]]: 每个子块的（内容, 标签元组）列表
         """
         if max_chars is None:
             max_chars = self.config.chunk_max_chars
@@ -39,23 +49,24 @@ class SpecialChunker:
             # 未知类型，按普通文本切分
             return self._chunk_generic(content, original_tags, max_chars)
     
-    def _chunk_code(self, content: str, original_tags: List[Tag], max_chars: int) -> List[Tuple[str, List[Tag]]]:
+    def _chunk_code(self, content: str, original_tags: Tuple[Tag, ...], max_chars: int) -> List[Tuple[str, Tuple[Tag, ...]]]:
         """
         切分代码块：尽量按空行或逻辑段落切分
         """
-        lines = content.split('\n')
+        # 每行自带换行符，拼接时无需插入分隔符，只需去掉块末尾的一个换行符
+        lines = _split_lines_keepends(content)
         chunks = []
         current_chunk = []
         current_length = 0
         
         for line in lines:
-            line_length = len(line) + 1  # 包括换行符
+            line_length = len(line)  # 包括换行符
             
             # 如果当前块不为空且添加该行会超过限制，则结束当前块
             if current_chunk and current_length + line_length > max_chars:
                 # 保存当前块
-                chunk_text = '\n'.join(current_chunk)
-                chunks.append((chunk_text, original_tags.copy()))
+                chunk_text = "".join(current_chunk)[:-1]
+                chunks.append((chunk_text, original_tags))
                 # 开始新块
                 current_chunk = [line]
                 current_length = line_length
@@ -65,17 +76,17 @@ class SpecialChunker:
         
         # 添加最后一个块
         if current_chunk:
-            chunk_text = '\n'.join(current_chunk)
-            chunks.append((chunk_text, original_tags.copy()))
+            chunk_text = "".join(current_chunk)[:-1]
+            chunks.append((chunk_text, original_tags))
         
         # 如果只有一个块且未超过限制，返回原样（不应该发生，因为只有超长才会调用）
         return chunks
     
-    def _chunk_table(self, content: str, original_tags: List[Tag], max_chars: int) -> List[Tuple[str, List[Tag]]]:
+    def _chunk_table(self, content: str, original_tags: Tuple[Tag, ...], max_chars: int) -> List[Tuple[str, Tuple[Tag, ...]]]:
         """
         切分表格：保持表头（前两行，第二行为Markdown表格分隔符），按行分组切分
         """
-        lines = content.split('\n')
+        lines = _split_lines_keepends(content)
         if not lines:
             return []
         
@@ -91,59 +102,72 @@ class SpecialChunker:
         chunks = []
         current_chunk = header_lines.copy()  # 初始块包含表头
         # 计算当前块长度（包括换行符）
-        current_length = sum(len(line) + 1 for line in current_chunk)
+        current_length = sum(map(len, current_chunk))
         
         for line in data_lines:
-            line_length = len(line) + 1
+            line_length = len(line)
             
             # 如果添加该行会超过限制，且当前块已经包含表头+至少一行数据，则结束当前块
             if current_chunk and current_length + line_length > max_chars and len(current_chunk) > len(header_lines):
-                chunk_text = '\n'.join(current_chunk)
-                chunks.append((chunk_text, original_tags.copy()))
+                chunk_text = "".join(current_chunk)[:-1]
+                chunks.append((chunk_text, original_tags))
                 # 新块以表头开始，并包含当前行
                 current_chunk = header_lines.copy()
                 current_chunk.append(line)
-                current_length = sum(len(l) + 1 for l in current_chunk)
+                current_length = sum(map(len, current_chunk))
             else:
                 current_chunk.append(line)
                 current_length += line_length
         
         # 添加最后一个块
         if current_chunk:
-            chunk_text = '\n'.join(current_chunk)
-            chunks.append((chunk_text, original_tags.copy()))
+            chunk_text = "".join(current_chunk)[:-1]
+            chunks.append((chunk_text, original_tags))
         
         return chunks
     
-    def _chunk_generic(self, content: str, original_tags: List[Tag], max_chars: int) -> List[Tuple[str, List[Tag]]]:
+    def _chunk_generic(self, content: str, original_tags: Tuple[Tag, ...], max_chars: int) -> List[Tuple[str, Tuple[Tag, ...]]]:
         """
         通用切分：按字符长度简单切分
         """
         if len(content) <= max_chars:
-            return [(content, original_tags.copy())]
+            return [(content, original_tags)]
         
         chunks = []
         start = 0
+        min_cut = max_chars * 0.7  # 截断点至少保留70%的容量
+        # 换行位置一次性建立有序索引，每次截断用二分查找代替 rfind 窗口扫描；
+        # 空格索引只有在换行处截断失败时才按需建立
+        newline_positions = [m.start() for m in re.finditer('\n', content)]
+        space_positions = None
         
         while start < len(content):
             end = start + max_chars
-            if end >= len(content):
-                chunk = content[start:]
-            else:
+            if end < len(content):
                 # 尽量在换行处截断
-                last_newline = content.rfind('\n', start, end)
-                if last_newline > start and last_newline - start > max_chars * 0.7:  # 至少保留70%的容量
+                last_newline = self._last_before(newline_positions, start, end)
+                if last_newline - start > min_cut:
                     end = last_newline
                 else:
                     # 或者在空格处截断
-                    last_space = content.rfind(' ', start, end)
-                    if last_space > start and last_space - start > max_chars * 0.7:
+                    if space_positions is None:
+                        space_positions = [m.start() for m in re.finditer(' ', content)]
+                    last_space = self._last_before(space_positions, start, end)
+                    if last_space - start > min_cut:
                         end = last_space
             
             chunk = content[start:end].strip()
             if chunk:
-                chunks.append((chunk, original_tags.copy()))
+                chunks.append((chunk, original_tags))
             
             start = end if end > start else start + max_chars
         
         return chunks
+
+    @staticmethod
+    def _last_before(positions: List[int], start: int, end: int) -> int:
+        """在有序位置列表中查找 [start, end) 内的最大位置（等价于 str.rfind），不存在返回 -1"""
+        idx = bisect.bisect_left(positions, end) - 1
+        if idx >= 0 and positions[idx] >= start:
+            return positions[idx]
+        return -1
@@ -1,8 +1,35 @@
-import re
-from typing import List, Optional
+from functools import lru_cache
+from typing import Optional, Pattern, Tuple
 from src.config.manager import ConfigManager
 from src.common.types import Tag
 
+
+@lru_cache(maxsize=8192)
+def _parse_tag(raw: str, tag_prefix: str, exclude: Tuple[Pattern, ...]) -> Optional[Tag]:
+    """
+    解析单个标签（raw 已 strip 且以 # 开头），按参数缓存结果：
+    重复出现的标签共享同一个不可变 Tag 实例，排除规则也只匹配一次
+    """
+    # 处理种子标签：将 #?xxx/yyy 转换为 #seed/xxx/yyy
+    if raw.startswith(f"#{tag_prefix}"):
+        # 转换：去掉#?，加上#seed/，确保有斜杠分隔符
+        seed_content = raw[2:]  # 去掉 "#?"
+        raw = f"#seed/{seed_content}"
+    
+    content = raw[1:]  # 去掉 #
+    
+    # 1. 检查排除规则（使用转换后的raw）
+    if any(p.match(raw) for p in exclude):
+        return None
+
+    # 2. 解析 Key/Value
+    parts = content.split('/', 1)
+    key = parts[0] if len(parts) > 1 else "topic"
+    value = parts[1] if len(parts) > 1 else parts[0]
+
+    return Tag(key=key, value=value, original_text=raw)
+
+
 class TagExtractorNode:
     """节点功能：标签提取与清洗"""
     
@@ -11,27 +38,9 @@ class TagExtractorNode:
 
     def extract_from_text(self, text: str) -> Optional[Tag]:
         """从文本中解析标签，如果被过滤则返回 None"""
-        if not text.strip().startswith("#"):
-            return None
-            
         raw = text.strip()
-        
-        # 处理种子标签：将 #?xxx/yyy 转换为 #seed/xxx/yyy
-        if raw.startswith(f"#{self.config.tag_prefix}"):
-            # 转换：去掉#?，加上#seed/，确保有斜杠分隔符
-            seed_content = raw[2:]  # 去掉 "#?"
-            raw = f"#seed/{seed_content}"
-        
-        content = raw[1:]  # 去掉 #
-        
-        # 1. 检查排除规则（使用转换后的raw）
-        for pattern in self.config.exclude_patterns:
-            if pattern.match(raw):
-                return None
-
-        # 2. 解析 Key/Value
-        parts = content.split('/', 1)
-        key = parts[0] if len(parts) > 1 else "topic"
-        value = parts[1] if len(parts) > 1 else parts[0]
-
-        return Tag(key=key, value=value, original_text=raw)
+        if not raw.startswith("#"):
+            return None
+
+        # 排除规则以编译后的正则作为缓存键，配置重新加载后自然失效
+        return _parse_tag(raw, self.config.tag_prefix, self.config.exclude_matchers)
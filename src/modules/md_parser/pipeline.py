@@ -1,8 +1,11 @@
 import os
 import concurrent.futures
-from typing import List, Optional
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
+import charset_normalizer
 from src.config.manager import ConfigManager
 from src.common.types import ParsedBlock
+from src.common.logger import get_logger, worker_logging
 # 导入各个独立的节点
 from src.modules.md_parser.nodes.row_parser import RowParserNode
 from src.modules.md_parser.nodes.tag_extractor import TagExtractorNode
@@ -12,12 +15,13 @@ class MarkdownParserPipeline:
     """
     模块一的总控管道
     职责: 编排各个节点，将 Markdown 文件转换为结构化 Blocks
-    支持多线程批量处理和可变参数文件处理
+    支持多进程批量处理和可变参数文件处理
     """
 
     def __init__(self):
         # 1. 获取单例配置
         self.config = ConfigManager()
+        self.logger = get_logger('tag_rag.md_parser')
 
         # 2. 初始化各节点 (组装流水线)
         # 节点1: 负责基础行识别
@@ -29,105 +33,222 @@ class MarkdownParserPipeline:
         # 节点3: 负责上下文作用域合并 (它依赖节点2)
         self.scope_builder = ScopeBuilderNode(self.config, self.tag_extractor)
 
-    def run(self, file_path: str) -> List[ParsedBlock]:
+    def run(self, file_path: str, raw: Optional[bytes] = None) -> List[ParsedBlock]:
         """
         执行流水线: File -> Rows -> Blocks
+        
+        Args:
+            file_path: 文件路径
+            raw: 已预读的文件字节，为 None 时从磁盘读取
         """
-        if not os.path.exists(file_path):
-            print(f"[Warning] File not found: {file_path}")
+        if raw is None and not os.path.exists(file_path):
+            self.logger.warning(f"File not found: {file_path}")
             return []
 
         try:
-            # Stage 1: IO 读取，尝试多种编码以兼容不同格式
-            raw_lines = None
-            encodings_to_try = ['utf-8-sig', 'utf-8', 'utf-16', 'gbk', 'latin-1']
-            
-            for encoding in encodings_to_try:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        raw_lines = f.readlines()
-                    # 如果成功读取，则退出循环
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if raw_lines is None:
-                print(f"[Error] Failed to decode {file_path} with tried encodings: {encodings_to_try}")
-                return []
+            # Stage 1: IO 读取，只读取一次字节并解码一次以兼容不同编码
+            if raw is None:
+                raw = self._read_bytes(file_path)
+            text = self._decode(raw)
 
-            # Stage 2: 行级解析 (Raw Strings -> Row Objects)
-            rows = self.row_parser.process(raw_lines)
+            # Stage 2: 行级解析 (Raw Strings -> Row Objects，惰性产出)
+            rows = self.row_parser.process(self._iter_lines(text))
 
             # Stage 3: 结构化构建 (Row Objects -> ParsedBlocks)
             # 这一步内部会自动处理标签提取和标题作用域
-            blocks = self.scope_builder.run(rows, file_path)
-
-            return blocks
+            return self.scope_builder.run(rows, file_path)
 
         except Exception as e:
-            print(f"[Error] Failed to process {file_path}: {e}")
+            self.logger.error(f"Failed to process {file_path}: {e}")
             # 根据需求，这里可以选择 raise 抛出异常或者返回空列表
             return []
 
-    def process_files(self, *file_paths: str) -> List[ParsedBlock]:
+    @staticmethod
+    def _read_bytes(file_path: str) -> bytes:
+        """一次性读取文件的全部字节"""
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def _prefetch(file_path: str) -> Optional[bytes]:
+        """预读任务：读取失败时返回 None，交由 run 按常规路径读取并报告错误"""
+        try:
+            return MarkdownParserPipeline._read_bytes(file_path)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _decode(raw: bytes) -> str:
+        """
+        将文件字节解码为文本：绝大多数文件为 UTF-8（可带 BOM），直接解码；
+        否则由 charset_normalizer 对同一份字节一次性检测编码，检测失败时按 latin-1 兜底
+        """
+        try:
+            return raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            pass
+        best = charset_normalizer.from_bytes(raw).best()
+        if best is not None:
+            return str(best)
+        return raw.decode('latin-1')
+
+    @staticmethod
+    def _iter_lines(text: str) -> Iterator[str]:
         """
-        处理可变数量的文件，支持多线程批量处理
+        逐行切片产出文本（保留行尾换行符），不构建行列表，也不像 StringIO 那样复制整份文本。
+        与文本模式打开文件一致，\r\n 和 \r 统一转换为 \n（仅在存在 \r 时才需替换）
+        """
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        find = text.find
+        start = 0
+        end = find('\n')
+        while end >= 0:
+            yield text[start:end + 1]
+            start = end + 1
+            end = find('\n', start)
+        if start < len(text):
+            yield text[start:]
+
+    def run_many(self, file_paths: List[str], workers: Optional[int] = None) -> List[ParsedBlock]:
+        """
+        多进程处理多个文件：解析为纯 Python 的 CPU 密集计算，线程受 GIL 限制，
+        进程池可随核数扩展。每个工作进程只创建一次自己的管道实例
         
         Args:
-            *file_paths: 可变数量的文件路径
+            file_paths: 文件路径列表
+            workers: 进程数，None 表示使用配置 parser.max_workers（未配置时为 CPU 核数）
             
         Returns:
-            List[ParsedBlock]: 所有文件的块合并列表
+            List[ParsedBlock]: 所有文件的块合并列表（按 file_paths 顺序）
         """
         if not file_paths:
             return []
         
-        all_blocks = []
+        max_workers = self._worker_count(len(file_paths), workers)
+        with worker_logging() as log_kwargs, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, **log_kwargs) as executor:
+            results = executor.map(_run_in_worker, file_paths, chunksize=8)
+            return list(chain.from_iterable(results))
+
+    def _worker_count(self, n_files: int, workers: Optional[int] = None) -> int:
+        """解析进程数：显式参数 > 配置 parser.max_workers > CPU 核数，且不超过文件数"""
+        workers = workers or self.config.parser_max_workers or os.cpu_count() or 1
+        return max(1, min(workers, n_files))
+
+    def iter_files(self, *file_paths: str) -> Iterator[Tuple[str, List[ParsedBlock]]]:
+        """
+        多进程处理可变数量的文件，每处理完一个文件即产出其结果，
+        便于下游（如向量化）在其余文件仍在解析时开始消费
+        
+        Args:
+            *file_paths: 可变数量的文件路径
+            
+        Yields:
+            Tuple[str, List[ParsedBlock]]: （文件路径, 该文件的块列表），按完成顺序产出
+        """
+        if not file_paths:
+            return
         
-        # 使用线程池处理多个文件
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(file_paths), 4)) as executor:
+        workers = self._worker_count(len(file_paths))
+        if workers == 1:
+            # 单个进程即可完成时直接在本进程处理，省去进程池的启动和结果序列化开销；
+            # 解析当前文件的同时由读取线程预读下一个文件（读取时释放 GIL），I/O 等待与解析重叠
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as reader:
+                pending = reader.submit(self._prefetch, file_paths[0])
+                for i, file_path in enumerate(file_paths):
+                    raw = pending.result()
+                    if i + 1 < len(file_paths):
+                        pending = reader.submit(self._prefetch, file_paths[i + 1])
+                    blocks = self.run(file_path, raw)
+                    self.logger.info(f"Processed {file_path}: {len(blocks)} blocks")
+                    yield file_path, blocks
+            return
+        
+        # 解析为 CPU 密集的纯 Python 计算，使用进程池绕开 GIL；工作进程的日志经队列转发回本进程输出
+        with worker_logging() as log_kwargs, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=workers, **log_kwargs) as executor:
             # 提交任务
-            future_to_file = {executor.submit(self.run, fp): fp for fp in file_paths}
+            future_to_file = {executor.submit(_run_in_worker, fp): fp for fp in file_paths}
             
             # 收集结果
             for future in concurrent.futures.as_completed(future_to_file):
                 file_path = future_to_file[future]
                 try:
                     blocks = future.result()
-                    all_blocks.extend(blocks)
-                    print(f"[Info] Processed {file_path}: {len(blocks)} blocks")
                 except Exception as e:
-                    print(f"[Error] Failed to process {file_path}: {e}")
+                    self.logger.error(f"Failed to process {file_path}: {e}")
+                    continue
+                self.logger.info(f"Processed {file_path}: {len(blocks)} blocks")
+                yield file_path, blocks
+
+    def process_files(self, *file_paths: str) -> List[ParsedBlock]:
+        """
+        处理可变数量的文件，支持多进程批量处理
         
+        Args:
+            *file_paths: 可变数量的文件路径
+            
+        Returns:
+            List[ParsedBlock]: 所有文件的块合并列表
+        """
+        all_blocks = []
+        for _, blocks in self.iter_files(*file_paths):
+            all_blocks.extend(blocks)
         return all_blocks
 
-    def process_directory(self, input_dir: Optional[str] = None) -> List[ParsedBlock]:
+    def collect_files(self, input_dir: Optional[str] = None) -> List[str]:
         """
-        处理指定目录下的所有文件（根据配置的后缀白名单）
+        收集指定目录下所有符合后缀白名单的文件
         
         Args:
             input_dir: 输入目录路径，如果为None则使用配置中的input_dir
             
         Returns:
-            List[ParsedBlock]: 所有文件的块合并列表
+            List[str]: 文件路径列表
         """
         if input_dir is None:
             input_dir = self.config.input_dir
         
         if not os.path.exists(input_dir):
-            print(f"[Warning] Directory not found: {input_dir}")
+            self.logger.warning(f"Directory not found: {input_dir}")
             return []
         
-        # 收集所有符合后缀的文件
+        # 收集所有符合后缀的文件（endswith 接受元组，一次调用匹配全部后缀）
+        extensions = tuple(self.config.file_extensions)
         file_paths = []
         for root, dirs, files in os.walk(input_dir):
             for file in files:
-                if any(file.endswith(ext) for ext in self.config.file_extensions):
+                if file.endswith(extensions):
                     file_paths.append(os.path.join(root, file))
         
         if not file_paths:
-            print(f"[Info] No files found with extensions {self.config.file_extensions} in {input_dir}")
+            self.logger.info(f"No files found with extensions {self.config.file_extensions} in {input_dir}")
             return []
         
-        print(f"[Info] Found {len(file_paths)} files to process")
-        return self.process_files(*file_paths)
+        self.logger.info(f"Found {len(file_paths)} files to process")
+        return file_paths
+
+    def process_directory(self, input_dir: Optional[str] = None) -> List[ParsedBlock]:
+        """
+        处理指定目录下的所有文件（根据配置的后缀白名单）
+        
+        Args:
+            input_dir: 输入目录路径，如果为None则使用配置中的input_dir
+            
+        Returns:
+            List[ParsedBlock]: 所有文件的块合并列表
+        """
+        return self.process_files(*self.collect_files(input_dir))
+
+
+# 工作进程内的管道实例（每个进程首次处理文件时创建，之后复用）
+_worker_pipeline: Optional[MarkdownParserPipeline] = None
+
+
+def _run_in_worker(file_path: str) -> List[ParsedBlock]:
+    """进程池任务：使用本进程的管道处理单个文件（模块级函数，可被 pickle）"""
+    global _worker_pipeline
+    if _worker_pipeline is None:
+        _worker_pipeline = MarkdownParserPipeline()
+    return _worker_pipeline.run(file_path)
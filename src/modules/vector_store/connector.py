@@ -1,5 +1,6 @@
 from typing import List
 from src.config.manager import ConfigManager
+from src.common.logger import get_logger
 from src.common.types import ParsedBlock
 from src.modules.vector_store.nodes.pipeline import VectorStorePipeline
 
@@ -11,9 +12,10 @@ class VectorStoreConnector:
     """
     def __init__(self):
         self.config = ConfigManager()
+        self.logger = get_logger('tag_rag.vector_store')
         self.pipeline = None
         self._initialize_pipeline()
-        print(f"[Module 2] Initialized Vector Store with dim={self.config.vector_dim}")
+        self.logger.info(f"Initialized Vector Store with dim={self.config.vector_dim}")
 
     def _initialize_pipeline(self):
         """初始化向量存储管道"""
@@ -26,22 +28,28 @@ class VectorStoreConnector:
         2. 如果管道初始化失败，将直接抛出异常
         """
         if not blocks:
-            print("[Module 2] 无块需要向量化")
+            self.logger.info("无块需要向量化")
             return
 
         # 使用管道处理块
-        print(f"[Module 2] 开始向量化 {len(blocks)} 个块...")
-        success, failure, failed_ids = self.pipeline.process_blocks(blocks, show_progress=True)
-        print(f"[Module 2] 向量化完成: {success} 成功, {failure} 失败")
-        if failure > 0:
-            print(f"[Module 2] 失败的块ID（前10个）: {failed_ids[:10]}")
+        self.logger.info(f"开始向量化 {len(blocks)} 个块...")
+        # 调试模式下展示前两个块的增强文本（直接复用管道处理时的结果）
+        preview_count = 2 if self.config.vector_store_debug else 0
+        success, failure, previews = self.pipeline.process_blocks(
+            blocks, show_progress=True, preview_count=preview_count
+        )
+        self.logger.info(f"向量化完成: {success} 成功, {failure} 失败")
+        if failure > 0 and self.pipeline.failed_blocks_path:
+            self.logger.warning(f"失败的块ID已追加到 {self.pipeline.failed_blocks_path}")
         
         # 显示前两个块的增强文本（调试信息）
-        for b in blocks[:2]:
-            augmented = self.pipeline.augmenter.augment_batch([b])[0]
-            print(f"   -> Block {b.block_id}:")
-            print(f"      Original content: {b.content[:100]}..." if len(b.content) > 100 else f"      Original content: {b.content}")
-            print(f"      Augmented text: {augmented[:150]}..." if len(augmented) > 150 else f"      Augmented text: {augmented}")
-            print(f"      Tags: {len(b.tags)}")
+        for b, augmented in previews:
+            lines = [
+                f"   -> Block {b.block_id}:",
+                f"      Original content: {b.content[:100]}..." if len(b.content) > 100 else f"      Original content: {b.content}",
+                f"      Augmented text: {augmented[:150]}..." if len(augmented) > 150 else f"      Augmented text: {augmented}",
+                f"      Tags: {len(b.tags)}",
+            ]
             if b.protected_element_type:
-                print(f"      Protected element type: {b.protected_element_type}")
+                lines.append(f"      Protected element type: {b.protected_element_type}")
+            self.logger.info("\n".join(lines))
@@ -1,9 +1,22 @@
+import operator
 import chromadb
+import numpy as np
 from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
 from src.common.types import ParsedBlock, Tag
 from src.config.manager import ConfigManager
 
+# 每个块都有的固定元数据字段，由 attrgetter 在一次 C 层调用中取出
+_BASE_METADATA_KEYS = (
+    "block_id",
+    "start_line",
+    "end_line",
+    "is_splited",
+    "protected_element_type",
+    "protected_element_overlength",
+)
+_get_base_metadata = operator.attrgetter(*_BASE_METADATA_KEYS)
+
 
 class ChromaDBStoreNode:
     """ChromaDB存储节点：将向量和元数据存储到ChromaDB（批处理）"""
@@ -29,22 +42,23 @@ class ChromaDBStoreNode:
         try:
             self.collection = self.client.get_collection(collection_name)
         except (ValueError, chromadb.errors.NotFoundError):
-            # 集合不存在，创建新集合
+            # 集合不存在，创建新集合（HNSW 参数只能在创建时指定）
             self.collection = self.client.create_collection(
                 name=collection_name,
-                metadata={"hnsw:space": "cosine"}  # 默认使用余弦相似度
+                metadata={
+                    "hnsw:space": self.config.chroma_hnsw_space,  # 默认使用余弦相似度
+                    "hnsw:M": self.config.chroma_hnsw_m,
+                    "hnsw:construction_ef": self.config.chroma_hnsw_construction_ef,
+                    "hnsw:search_ef": self.config.chroma_hnsw_search_ef,
+                }
             )
 
     def _prepare_metadata(self, block: ParsedBlock) -> Dict[str, Any]:
         """准备块的元数据"""
-        metadata = {
-            "block_id": block.block_id,
-            "start_line": block.start_line,
-            "end_line": block.end_line,
-            "is_splited": block.is_splited,
-            "protected_element_type": block.protected_element_type or "",
-            "protected_element_overlength": block.protected_element_overlength,
-        }
+        metadata = dict(zip(_BASE_METADATA_KEYS, _get_base_metadata(block)))
+        if metadata["protected_element_type"] is None:
+            # ChromaDB 元数据不接受 None
+            metadata["protected_element_type"] = ""
 
         # 添加标签
         for tag in block.tags:
@@ -52,11 +66,11 @@ class ChromaDBStoreNode:
 
         return metadata
 
-    def store_single(self, vector: List[float], block: ParsedBlock):
-        """存储单个向量和元数据"""
+    def store_single(self, vector: np.ndarray, block: ParsedBlock):
+        """存储单个向量和元数据（已存在的块ID会被覆盖）"""
         metadata = self._prepare_metadata(block)
-        self.collection.add(
-            embeddings=[vector],
+        self.collection.upsert(
+            embeddings=np.asarray(vector, dtype=np.float32).reshape(1, -1),
             metadatas=[metadata],
             ids=[block.block_id],
             documents=[block.content]  # 可选：存储原始文本
@@ -64,27 +78,40 @@ class ChromaDBStoreNode:
 
     def store_batch(
         self,
-        vectors: List[List[float]],
+        vectors: Sequence[np.ndarray],
         blocks: List[ParsedBlock],
-        batch_size: int = 100
+        batch_size: Optional[int] = None
     ):
-        """批量存储向量和元数据"""
-        for i in range(0, len(vectors), batch_size):
-            batch_vectors = vectors[i:i + batch_size]
-            batch_blocks = blocks[i:i + batch_size]
+        """
+        批量存储向量和元数据：向量一次性合并为 (块数, 维度) 的 float32 矩阵，
+        按行切片（视图，不复制）直接交给 ChromaDB，不经过 Python 浮点列表
+        每 batch_size 个块（默认取配置 chromadb.store_batch_size）调用一次 upsert，
+        重复入库的块ID直接覆盖
+        """
+        if batch_size is None:
+            batch_size = self.config.chroma_store_batch_size
+        matrix = np.asarray(vectors, dtype=np.float32)
+        prepare_metadata = self._prepare_metadata
+        for i in range(0, len(matrix), batch_size):
+            batch_vectors = matrix[i:i + batch_size]
 
-            ids = [block.block_id for block in batch_blocks]
-            metadatas = [self._prepare_metadata(block) for block in batch_blocks]
-            documents = [block.content for block in batch_blocks]
+            # 一次遍历同时构建 id、元数据和文档列表
+            ids = []
+            metadatas = []
+            documents = []
+            for block in blocks[i:i + batch_size]:
+                ids.append(block.block_id)
+                metadatas.append(prepare_metadata(block))
+                documents.append(block.content)
 
-            self.collection.add(
+            self.collection.upsert(
                 embeddings=batch_vectors,
                 metadatas=metadatas,
                 ids=ids,
                 documents=documents
             )
 
-    def process(self, vectors: List[List[float]], blocks: List[ParsedBlock]):
+    def process(self, vectors: Sequence[np.ndarray], blocks: List[ParsedBlock]):
         """处理一批向量和块，存储到ChromaDB"""
         self.store_batch(vectors, blocks)
 
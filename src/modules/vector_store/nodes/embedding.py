@@ -1,25 +1,51 @@
 import os
+import re
 import time
+import base64
+import sqlite3
+import hashlib
 import threading
-from typing import List, Optional, Tuple
-from datetime import datetime, timedelta
-from openai import OpenAI, OpenAIError
+import concurrent.futures
+import importlib.util
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+import httpx
+import numpy as np
+from openai import (
+    APIStatusError, AuthenticationError, BadRequestError, DefaultHttpxClient, OpenAI, OpenAIError,
+    PermissionDeniedError,
+)
 from src.config.manager import ConfigManager
 from src.common.logger import get_logger
 
 
+# CJK 统一汉字基本区，用于令牌估算
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+
+# 重试也不会成功的错误：请求内容无效、密钥或权限错误
+_NON_RETRYABLE_ERRORS = (BadRequestError, AuthenticationError, PermissionDeniedError)
+# 与输入文本有关的错误：请求内容无效，或返回的向量数量/维度不符。只有这类失败才拆分批次重试；
+# 限流、连接、超时、服务端错误与文本无关，拆分只会放大请求量
+_INPUT_DEPENDENT_ERRORS = (BadRequestError, ValueError)
+
+
 class RateLimiter:
     """速率限制器，控制RPM（每分钟请求数）和TPM（每分钟令牌数）"""
     
-    def __init__(self, rpm: int = 10, tpm: int = 10000, enable_adaptive_delay: bool = True, initial_delay: float = 0.5):
+    def __init__(self, rpm: int = 10, tpm: int = 10000, enable_adaptive_delay: bool = True, initial_delay: float = 0.5,
+                 token_counter: Optional[Callable[[str], int]] = None):
         self.rpm = rpm
         self.tpm = tpm
         self.enable_adaptive_delay = enable_adaptive_delay
         self.initial_delay = initial_delay
+        # 令牌计数函数：默认使用启发式估算，可传入分词器实现精确计数
+        self.count_tokens = token_counter or self._estimate_tokens
         
-        # 请求历史记录
-        self.request_times = []
-        self.token_counts = []
+        # 请求历史记录（按时间先后追加，过期记录从队头弹出）
+        # 时间戳取自 time.monotonic()（秒），不受系统时钟调整影响
+        self.request_times: Deque[float] = deque()
+        self.token_counts: Deque[Tuple[float, int]] = deque()
+        self._token_total = 0  # token_counts 中令牌数之和，随追加/弹出增量维护
         self.lock = threading.RLock()
         
         # 自适应延迟参数
@@ -30,10 +56,14 @@ class RateLimiter:
         self.recovery_factor = 0.9
     
     def _clean_old_records(self):
-        """清理一分钟前的记录"""
-        one_minute_ago = datetime.now() - timedelta(minutes=1)
-        self.request_times = [t for t in self.request_times if t > one_minute_ago]
-        self.token_counts = [t for t in self.token_counts if t[0] > one_minute_ago]
+        """清理一分钟前的记录（记录按时间有序，只需从队头弹出，均摊 O(1)）"""
+        one_minute_ago = time.monotonic() - 60.0
+        request_times = self.request_times
+        while request_times and request_times[0] <= one_minute_ago:
+            request_times.popleft()
+        token_counts = self.token_counts
+        while token_counts and token_counts[0][0] <= one_minute_ago:
+            self._token_total -= token_counts.popleft()[1]
     
     def _get_current_rpm(self) -> float:
         """计算当前RPM"""
@@ -43,30 +73,34 @@ class RateLimiter:
     def _get_current_tpm(self) -> int:
         """计算当前TPM"""
         self._clean_old_records()
-        one_minute_ago = datetime.now() - timedelta(minutes=1)
-        return sum(tokens for timestamp, tokens in self.token_counts if timestamp > one_minute_ago)
+        return self._token_total
     
-    def _estimate_tokens(self, text: str) -> int:
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
         """估算文本的令牌数（简单估算，中文大约2字符=1个token）"""
         # 对于中文，使用简单估算：1个汉字约等于1.3个token，标点和空格等忽略
-        chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
+        # 汉字计数由预编译正则在 C 层完成，避免逐字符的 Python 循环
+        chinese_chars = len(_CJK_RE.findall(text))
         # 对于英文字母和数字
         other_chars = len(text) - chinese_chars
         # 估算：中文字符*1.3 + 其他字符*0.25
         estimated = int(chinese_chars * 1.3 + other_chars * 0.25)
         return max(estimated, 1)
     
-    def wait_if_needed(self, texts: List[str]) -> float:
+    def wait_if_needed(self, texts: List[str], total_tokens: Optional[int] = None) -> float:
         """
         如果需要等待以满足速率限制，则进行等待
+        total_tokens 为调用方已算好的令牌总数（如切分批次时的计数），为 None 时在此计算
         返回实际等待的时间（秒）
         """
+        if total_tokens is None:
+            # 计算总令牌数（纯计算、不涉及共享状态，在锁外完成以缩短临界区）
+            count_tokens = self.count_tokens
+            total_tokens = sum(count_tokens(text) for text in texts)
+        
         with self.lock:
             self._clean_old_records()
             
-            # 估算总令牌数
-            total_tokens = sum(self._estimate_tokens(text) for text in texts)
-            
             # 检查是否超过限制
             current_rpm = self._get_current_rpm()
             current_tpm = self._get_current_tpm()
@@ -89,16 +123,16 @@ class RateLimiter:
             # 检查RPM限制
             if current_rpm >= self.rpm:
                 # 需要等待直到有请求槽位
-                oldest_time = min(self.request_times) if self.request_times else datetime.now()
-                time_since_oldest = (datetime.now() - oldest_time).total_seconds()
+                now = time.monotonic()
+                oldest_time = self.request_times[0] if self.request_times else now
+                time_since_oldest = now - oldest_time
                 wait_time = max(wait_time, 60 - time_since_oldest)
             
             # 检查TPM限制
             if current_tpm + total_tokens > self.tpm:
                 # 需要等待直到令牌重置
                 if self.token_counts:
-                    oldest_token_time = min(timestamp for timestamp, _ in self.token_counts)
-                    time_since_oldest = (datetime.now() - oldest_token_time).total_seconds()
+                    time_since_oldest = time.monotonic() - self.token_counts[0][0]
                     wait_time = max(wait_time, 60 - time_since_oldest)
             
             # 添加基本延迟
@@ -109,21 +143,109 @@ class RateLimiter:
                 time.sleep(wait_time)
             
             # 记录请求
-            now = datetime.now()
+            now = time.monotonic()
             self.request_times.append(now)
             self.token_counts.append((now, total_tokens))
+            self._token_total += total_tokens
             
             return wait_time
 
 
+class EmbeddingCache:
+    """
+    向量磁盘缓存（SQLite）：键为 blake2b(模型, 维度, 文本) 的 16 字节摘要，值为 float32 向量的原始字节。
+    内容未变化的块重复入库时直接取缓存，省去网络往返和令牌消耗
+    """
+
+    # 单条 SQL 的参数个数上限（旧版 SQLite 为 999），批量查询按此分段
+    _MAX_PARAMS = 900
+
+    def __init__(self, path: str, model: str, dimension: Optional[int]):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 嵌入可能在后台线程中进行，连接跨线程使用，由锁串行化访问
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        # 模型与维度前缀的哈希状态只计算一次，每个文本从其副本继续哈希
+        self._prefix_hash = hashlib.blake2b(f"{model}\0{dimension}\0".encode(), digest_size=16, usedforsecurity=False)
+        self._logger = get_logger('tag_rag.embedding')
+
+    def key(self, text: str) -> bytes:
+        """计算文本的缓存键"""
+        h = self._prefix_hash.copy()
+        h.update(text.encode())
+        return h.digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """批量查询缓存，返回命中的 {键: 向量}"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), self._MAX_PARAMS):
+                part = unique_keys[i:i + self._MAX_PARAMS]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def get_or_compute_many(
+        self,
+        texts: List[str],
+        compute: Callable[[List[str]], Sequence[Optional[np.ndarray]]]
+    ) -> List[Optional[np.ndarray]]:
+        """
+        按内容取向量：命中缓存的直接返回，未命中的文本一次性交给 compute 计算，
+        计算成功（非 None）的结果写回缓存；结果按 texts 顺序返回
+        """
+        keys = [self.key(text) for text in texts]
+        cached = self.get_many(keys)
+        miss_indices = [i for i, key in enumerate(keys) if key not in cached]
+        if len(miss_indices) < len(texts):
+            self._logger.info(f"向量缓存命中 {len(texts) - len(miss_indices)}/{len(texts)}")
+        
+        results = [cached.get(key) for key in keys]
+        if miss_indices:
+            embeddings = compute([texts[i] for i in miss_indices])
+            new_items = []
+            for i, embedding in zip(miss_indices, embeddings):
+                results[i] = embedding
+                if embedding is not None:
+                    new_items.append((keys[i], embedding))
+            self.put_many(new_items)
+        
+        return results
+
+    def put_many(self, items: List[Tuple[bytes, np.ndarray]]):
+        """批量写入缓存（已存在的键忽略）"""
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (hash, vec) VALUES (?, ?)",
+                [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in items],
+            )
+            self._conn.commit()
+
+
 class EmbeddingNode:
     """嵌入节点：调用OpenAI兼容API生成文本向量（带速率限制的批处理）"""
 
+    # 进程内共享的客户端，按 (base_url, api_key) 缓存：重复创建节点时复用连接池，避免重新握手
+    _client_cache: Dict[Tuple[str, str], OpenAI] = {}
+    _client_cache_lock = threading.Lock()
+
     def __init__(self, config: ConfigManager = None):
         self.config = config or ConfigManager()
         self.client = self._init_client()
         self._dimension = self.config.vector_dim
         self._model = self.config.embedding_model
+        self._encoding_format = self.config.embedding_encoding_format
         self.logger = get_logger('tag_rag.embedding')
         
         # 初始化速率限制器
@@ -131,7 +253,8 @@ class EmbeddingNode:
             rpm=self.config.embedding_rpm,
             tpm=self.config.embedding_tpm,
             enable_adaptive_delay=self.config.embedding_enable_adaptive_delay,
-            initial_delay=self.config.embedding_request_delay
+            initial_delay=self.config.embedding_request_delay,
+            token_counter=self._init_token_counter()
         )
         
         # 根据API限制调整批处理大小
@@ -139,6 +262,13 @@ class EmbeddingNode:
         self.max_batch_size = min(self.config.batch_size, 16)  # 最大16个文本/请求
         self.max_tokens_per_request = 512  # SiliconFlow免费账户限制
 
+        # 子批次并发请求数（至少为1，即串行）
+        self.max_concurrent_requests = max(1, self.config.embedding_max_concurrent_requests)
+
+        # 向量磁盘缓存（未配置路径时关闭）
+        cache_path = self.config.embedding_cache_path
+        self.cache = EmbeddingCache(cache_path, self._model, self._dimension) if cache_path else None
+
     def _init_client(self) -> OpenAI:
         """初始化OpenAI客户端（兼容其他OpenAI兼容API）"""
         # 优先从配置读取API密钥
@@ -150,26 +280,61 @@ class EmbeddingNode:
             raise ValueError("未设置OpenAI API密钥：请在配置文件中配置 embedding.api_key（优先）或设置环境变量 OPENAI_API_KEY")
 
         base_url = self.config.embedding_api_base
-        return OpenAI(api_key=api_key, base_url=base_url)
+        key = (base_url, api_key)
+        with self._client_cache_lock:
+            client = self._client_cache.get(key)
+            if client is None:
+                # 显式的连接池客户端：批次之间复用 TCP/TLS 连接；安装了 h2 时启用 HTTP/2 多路复用。
+                # 同时在途的请求数 = 在途批次数 × 每批次并发子请求数，保活连接数不低于该值，
+                # 避免并发请求结束后连接被关闭、下一批次重新握手。
+                # DefaultHttpxClient 保留 SDK 自身的默认设置（超时、跟随重定向），只覆盖连接池参数
+                in_flight = (max(1, self.config.vector_store_max_concurrent_batches)
+                             * max(1, self.config.embedding_max_concurrent_requests))
+                http_client = DefaultHttpxClient(
+                    http2=importlib.util.find_spec("h2") is not None,
+                    limits=httpx.Limits(
+                        max_connections=max(64, in_flight),
+                        max_keepalive_connections=max(32, in_flight),
+                    ),
+                )
+                client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+                self._client_cache[key] = client
+            return client
+
+    def _init_token_counter(self) -> Optional[Callable[[str], int]]:
+        """配置了 tiktoken 编码时返回精确的令牌计数函数，否则返回 None（使用启发式估算）"""
+        encoding_name = self.config.embedding_tiktoken_encoding
+        if not encoding_name:
+            return None
+        try:
+            import tiktoken
+        except ImportError as e:
+            raise ImportError("已配置 embedding.tiktoken_encoding，但未安装 tiktoken：请执行 pip install tiktoken") from e
+        encode = tiktoken.get_encoding(encoding_name).encode_ordinary
+        return lambda text: len(encode(text))
 
-    def _create_batches(self, texts: List[str]) -> List[List[str]]:
-        """根据令牌限制创建批处理"""
+    def _create_batches(self, texts: List[str]) -> List[Tuple[List[str], int]]:
+        """
+        根据令牌限制创建批处理，返回 (批次文本, 批次令牌数) 列表；
+        每个文本只计数一次，批次令牌数直接交给速率限制器，无需再次计数
+        """
+        count_tokens = self.rate_limiter.count_tokens
         batches = []
         current_batch = []
         current_tokens = 0
         
         for text in texts:
-            text_tokens = self.rate_limiter._estimate_tokens(text)
+            text_tokens = count_tokens(text)
             
             # 如果单个文本超过限制，需要单独处理
             if text_tokens > self.max_tokens_per_request:
                 # 当前批处理先保存
                 if current_batch:
-                    batches.append(current_batch)
+                    batches.append((current_batch, current_tokens))
                     current_batch = []
                     current_tokens = 0
                 # 单个文本作为一批
-                batches.append([text])
+                batches.append(([text], text_tokens))
                 continue
             
             # 检查是否可以将文本加入当前批处理
@@ -177,7 +342,7 @@ class EmbeddingNode:
                 current_tokens + text_tokens > self.max_tokens_per_request):
                 # 当前批处理已满，保存并开始新批处理
                 if current_batch:
-                    batches.append(current_batch)
+                    batches.append((current_batch, current_tokens))
                 current_batch = [text]
                 current_tokens = text_tokens
             else:
@@ -187,19 +352,19 @@ class EmbeddingNode:
         
         # 添加最后一个批处理
         if current_batch:
-            batches.append(current_batch)
+            batches.append((current_batch, current_tokens))
         
         return batches
 
-    def _embed_batch(self, texts: List[str], max_retries: int = 3) -> List[List[float]]:
-        """处理单个批次的文本"""
+    def _embed_batch(self, texts: List[str], max_retries: int = 3) -> np.ndarray:
+        """处理单个批次的文本，返回 (文本数, 维度) 的 float32 矩阵"""
         for attempt in range(max_retries):
             try:
                 # 构建请求参数
                 params = {
                     "model": self._model,
                     "input": texts,
-                    "encoding_format": "float"
+                    "encoding_format": self._encoding_format
                 }
                 # 如果配置的维度不是默认值，传递dimensions参数
                 # 注意：某些模型可能不支持dimensions参数，但SiliconFlow的API需要
@@ -207,57 +372,162 @@ class EmbeddingNode:
                     params["dimensions"] = self._dimension
                 
                 response = self.client.embeddings.create(**params)
-                embeddings = [item.embedding for item in response.data]
+                vectors = [self._decode_embedding(item.embedding) for item in response.data]
+                if len(vectors) != len(texts):
+                    raise ValueError(f"嵌入数量不匹配: 期望 {len(texts)}, 实际 {len(vectors)}")
+                dimension = self._dimension or len(vectors[0])
                 
-                # 验证维度
-                for i, embedding in enumerate(embeddings):
-                    if len(embedding) != self._dimension:
+                # 直接写入 float32 矩阵：每个分量 4 字节，而 Python float 列表每个分量约 32 字节
+                embeddings = np.empty((len(vectors), dimension), dtype=np.float32)
+                for i, vector in enumerate(vectors):
+                    # 验证维度
+                    if len(vector) != dimension:
                         raise ValueError(
-                            f"嵌入维度不匹配（文本{i}）: 期望 {self._dimension}, 实际 {len(embedding)}"
+                            f"嵌入维度不匹配（文本{i}）: 期望 {dimension}, 实际 {len(vector)}"
                         )
+                    embeddings[i] = vector
                 
                 return embeddings
             except OpenAIError as e:
-                if attempt == max_retries - 1:
+                if attempt == max_retries - 1 or isinstance(e, _NON_RETRYABLE_ERRORS):
                     raise
-                wait_time = 2 ** attempt  # 指数退避
-                time.sleep(wait_time)
+                time.sleep(self._retry_delay(e, attempt))
                 continue
 
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        """批量生成向量（带速率限制）"""
+    @staticmethod
+    def _retry_delay(error: OpenAIError, attempt: int) -> float:
+        """重试前的等待时间：服务端给出 Retry-After（如 429 限流）时按其等待，否则指数退避"""
+        if isinstance(error, APIStatusError):
+            retry_after = error.response.headers.get("retry-after")
+            try:
+                return min(max(float(retry_after), 0.0), 60.0)
+            except (TypeError, ValueError):
+                pass
+        return 2 ** attempt  # 指数退避
+
+    @staticmethod
+    def _decode_embedding(embedding) -> Sequence[float]:
+        """
+        解析单个向量：base64 格式为小端 float32 原始字节，直接按字节构造数组，无需解析 JSON 浮点数；
+        服务端忽略 encoding_format 而返回浮点列表时原样返回
+        """
+        if isinstance(embedding, str):
+            return np.frombuffer(base64.b64decode(embedding), dtype='<f4')
+        return embedding
+
+    def _embed_batch_limited(self, index: int, total: int, batch_with_tokens: Tuple[List[str], int]) -> Tuple[float, Sequence[Optional[np.ndarray]]]:
+        """应用速率限制后处理单个批次，返回（等待时间, 向量列表）；失败时以 None 占位"""
+        batch, tokens = batch_with_tokens
+        wait_time = self.rate_limiter.wait_if_needed(batch, tokens)
+        try:
+            return wait_time, self._embed_batch(batch)
+        except _INPUT_DEPENDENT_ERRORS:
+            if len(batch) == 1:
+                self.logger.exception("批次 %d/%d 处理失败", index + 1, total)
+                return wait_time, [None]
+            # 将批次对半拆分再请求：个别文本（如超长）导致的失败只影响这些文本本身
+            self.logger.warning("批次 %d/%d 处理失败，拆分为更小的批次重试", index + 1, total, exc_info=True)
+        except Exception:
+            # 与文本无关的失败（限流、连接、超时、服务端、密钥错误等）：整批记为失败，不再追加请求
+            self.logger.exception("批次 %d/%d 处理失败", index + 1, total)
+            return wait_time, [None] * len(batch)
+        salvage_wait = 0.0
+        try:
+            salvage_wait, vectors = self._embed_salvage(batch)
+        except Exception:
+            # 拆分过程中出现与文本无关的失败，立即停止拆分，整批记为失败
+            self.logger.exception("批次 %d/%d 拆分重试中止", index + 1, total)
+            vectors = [None] * len(batch)
+        return wait_time + salvage_wait, vectors
+
+    def _embed_salvage(self, batch: List[str]) -> Tuple[float, List[Optional[np.ndarray]]]:
+        """
+        二分拆分请求失败的批次：两半各自请求（只尝试一次，拆分本身即重试），因输入导致失败的一半继续拆分，
+        直到单个文本；只有单独请求也失败的文本以 None 占位。返回（速率限制等待时间, 向量列表）
+        与文本无关的失败直接抛出，由调用方将整批记为失败
+        """
+        wait_time = 0.0
+        results: List[Optional[np.ndarray]] = []
+        mid = len(batch) // 2
+        for part in (batch[:mid], batch[mid:]):
+            wait_time += self.rate_limiter.wait_if_needed(part)
+            try:
+                results.extend(self._embed_batch(part, max_retries=1))
+                continue
+            except _INPUT_DEPENDENT_ERRORS:
+                if len(part) == 1:
+                    self.logger.exception("文本嵌入失败（%d 字符）", len(part[0]))
+                    results.append(None)
+                    continue
+            part_wait, vectors = self._embed_salvage(part)
+            wait_time += part_wait
+            results.extend(vectors)
+        return wait_time, results
+
+    def embed_batch(self, texts: List[str], use_cache: bool = True) -> List[Optional[np.ndarray]]:
+        """
+        批量生成向量（带速率限制），每个向量为 float32 一维数组（失败的文本为 None）
+        相同文本只生成一次向量（模板化标签、样板内容等会产生重复的增强文本），结果按原顺序返回
+        use_cache 为 False 时不查询磁盘缓存、全部请求API（结果仍写入缓存），用于需要真实请求耗时的场景
+        """
         if not texts:
             return []
         
+        # 一次遍历完成去重：first_of 记录每个不同文本的序号，positions 记录每个输入对应的序号
+        first_of: Dict[str, int] = {}
+        positions = [first_of.setdefault(text, len(first_of)) for text in texts]
+        if len(first_of) == len(texts):
+            return self._embed_unique(texts, use_cache)
+        
+        self.logger.info(f"批次内重复文本 {len(texts) - len(first_of)}/{len(texts)}，仅请求不同的文本")
+        vectors = self._embed_unique(list(first_of), use_cache)
+        return [vectors[pos] for pos in positions]
+
+    def _embed_unique(self, texts: List[str], use_cache: bool = True) -> List[Optional[np.ndarray]]:
+        """
+        为互不相同的文本生成向量：
+        先查询磁盘缓存，只为未命中的文本请求API，成功的结果写回缓存；结果按原顺序返回
+        """
+        if self.cache is None:
+            return self._embed_uncached(texts)
+        if not use_cache:
+            vectors = self._embed_uncached(texts)
+            cache = self.cache
+            cache.put_many([(cache.key(text), vec) for text, vec in zip(texts, vectors) if vec is not None])
+            return vectors
+        return self.cache.get_or_compute_many(texts, self._embed_uncached)
+
+    def _embed_uncached(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        请求API生成向量
+        多个子批次通过有界线程池并发请求，速率限制器负责错开发送时间，
+        请求的网络往返彼此重叠；结果按原顺序拼接
+        """
         # 根据令牌限制创建批处理
         batches = self._create_batches(texts)
+        total = len(batches)
+        
+        workers = min(self.max_concurrent_requests, total)
+        if workers <= 1:
+            outcomes = [self._embed_batch_limited(i, total, batch) for i, batch in enumerate(batches)]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                outcomes = list(executor.map(self._embed_batch_limited, range(total), [total] * total, batches))
         
         results = []
         total_wait_time = 0
-        
-        for i, batch in enumerate(batches):
-            # 应用速率限制
-            wait_time = self.rate_limiter.wait_if_needed(batch)
+        for wait_time, embeddings in outcomes:
             total_wait_time += wait_time
-            
-            # 处理当前批次
-            try:
-                embeddings = self._embed_batch(batch)
-                results.extend(embeddings)
-            except Exception as e:
-                # 如果单个批次失败，记录错误但继续处理其他批次
-                self.logger.error(f"批次 {i+1}/{len(batches)} 处理失败: {e}")
-                # 为失败的批次添加空向量占位符
-                results.extend([None] * len(batch))
+            results.extend(embeddings)
         
         if total_wait_time > 0:
             self.logger.info(f"速率限制等待总时间: {total_wait_time:.2f}秒")
         
         return results
 
-    def process(self, texts: List[str]) -> List[List[float]]:
+    def process(self, texts: List[str], use_cache: bool = True) -> List[Optional[np.ndarray]]:
         """处理一批文本，返回向量列表"""
-        return self.embed_batch(texts)
+        return self.embed_batch(texts, use_cache)
 
     def get_dimension(self) -> int:
         """返回嵌入维度"""
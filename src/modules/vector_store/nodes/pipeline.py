@@ -1,13 +1,101 @@
+import os
+import json
+import asyncio
 import time
-from typing import List, Tuple, Optional
+import functools
+import concurrent.futures
+from collections import deque
+from typing import Dict, List, Tuple, Optional
+import numpy as np
 from tqdm import tqdm
 from src.common.types import ParsedBlock
 from src.config.manager import ConfigManager
+from src.common.logger import get_logger
 from .text_augmenter import TextAugmenterNode
 from .embedding import EmbeddingNode
 from .chroma_store import ChromaDBStoreNode
 
 
+# 批大小自动调优的候选值（按顺序试探）
+_AUTOTUNE_CANDIDATES = (8, 16, 32, 64, 128, 256)
+# 调优结果文件（位于 ChromaDB 持久化目录下），按 (嵌入模型, 集合名) 记录选定的批大小
+_AUTOTUNE_FILE = "batch_size_tuning.json"
+
+
+class _StoreBuffer:
+    """
+    存储缓冲：累计嵌入成功的块，达到 store_batch_size 后一次性写入，并统计成功/失败
+    失败块的ID逐行追加写入失败日志（不在内存中累积），便于之后重试；
+    日志文件在第一次出现失败时才打开，没有失败的处理不创建、不打开文件
+    """
+
+    def __init__(self, store: ChromaDBStoreNode, store_batch_size: int, logger,
+                 failure_log_path: Optional[str] = None):
+        self.store = store
+        self.store_batch_size = store_batch_size
+        self.logger = logger
+        self.failure_log_path = failure_log_path
+        self._failure_log = None
+        self.success_count = 0
+        self.failure_count = 0
+        self._blocks: List[ParsedBlock] = []
+        self._vectors: List[np.ndarray] = []
+
+    def fail(self, batch: List[ParsedBlock]) -> None:
+        """记录失败块"""
+        self.failure_count += len(batch)
+        self._log_failed(batch)
+
+    def _log_failed(self, blocks: List[ParsedBlock]) -> None:
+        """将失败块的ID追加到失败日志（未配置日志时只计数）"""
+        if not self.failure_log_path or not blocks:
+            return
+        if self._failure_log is None:
+            # 以追加模式打开（大缓冲区，逐块写入不触发系统调用）
+            os.makedirs(os.path.dirname(self.failure_log_path) or '.', exist_ok=True)
+            self._failure_log = open(self.failure_log_path, 'a', encoding='utf-8', buffering=1 << 20)
+        self._failure_log.write("".join([f"{b.block_id}\n" for b in blocks]))
+
+    def close(self) -> None:
+        """关闭失败日志（未打开时无操作）"""
+        if self._failure_log is not None:
+            self._failure_log.close()
+            self._failure_log = None
+
+    def add(self, batch: List[ParsedBlock], vectors) -> None:
+        """放入一个批次的嵌入结果；嵌入失败的块（向量为 None）单独计为失败，不影响同批次的其他块"""
+        # 循环内只访问局部变量，计数在循环结束后一次写回
+        append_block = self._blocks.append
+        append_vector = self._vectors.append
+        failed = []
+        for block, vector in zip(batch, vectors):
+            if vector is None:
+                # 该块所在的嵌入子批次失败
+                failed.append(block)
+            else:
+                append_block(block)
+                append_vector(vector)
+        if failed:
+            self.fail(failed)
+        if len(self._blocks) >= self.store_batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """3. 将缓冲区中的向量一次性存储到ChromaDB"""
+        blocks = self._blocks
+        if not blocks:
+            return
+        count = len(blocks)
+        try:
+            self.store.process(self._vectors, blocks)
+            self.success_count += count
+        except Exception:
+            self.fail(blocks)
+            self.logger.exception("存储失败（%d 个块）", count)
+        self._blocks = []
+        self._vectors = []
+
+
 class VectorStorePipeline:
     """向量存储管道：协调文本增强、嵌入生成和存储三个节点（批处理）"""
 
@@ -23,59 +111,230 @@ class VectorStorePipeline:
         self.embedder = embedder or EmbeddingNode(self.config)
         self.store = store or ChromaDBStoreNode(self.config)
         self.batch_size = self.config.batch_size
+        # 同时在途（增强+嵌入中）的批次数，至少为1（即串行）
+        self.max_concurrent_batches = max(1, self.config.vector_store_max_concurrent_batches)
+        # 存储缓冲：累计多个批次的向量后一次性写入ChromaDB
+        self.store_batch_size = max(1, self.config.chroma_store_batch_size)
+        # 失败块ID的追加日志路径（为空时不记录）
+        self.failed_blocks_path = self.config.vector_store_failed_blocks_path
+        self.logger = get_logger('tag_rag.vector_store')
+
+        # 批大小自动调优：已选定的批大小（None 表示尚未调优完成）与各候选值的单块耗时
+        self.autotune = self.config.vector_store_autotune_batch_size
+        self._tuned_batch_size: Optional[int] = None
+        self._probe_timings: Dict[int, float] = {}
+        if self.autotune:
+            self._tuned_batch_size = self._load_tuned_batch_size()
 
     def process_blocks(
         self,
         blocks: List[ParsedBlock],
-        show_progress: bool = True
-    ) -> Tuple[int, int, List[str]]:
+        show_progress: bool = True,
+        preview_count: int = 0
+    ) -> Tuple[int, int, List[Tuple[ParsedBlock, str]]]:
         """
-        处理一批块，返回（成功数，失败数，失败块ID列表）
+        处理一批块，返回（成功数，失败数，前 preview_count 个（块, 增强文本））
+        增强文本取自处理过程中的结果，供调试展示，无需重新增强；
+        失败块的ID追加写入 failed_blocks_path，出现失败时才打开文件，每次调用最多打开一次
+
+        全部块先一次性增强，增强文本相同的块只嵌入一次；不同的文本按长度排序分批：同一批次内文本长短相近，
+        服务端按批内最长文本填充时浪费最少，按令牌上限切分子批次也更紧凑。
+        块与其文本一同重排，向量与块的对应关系不变（存储顺序与输入顺序无关）
+
+        多个批次流水线执行：嵌入（网络密集）在有界线程池中并发进行，
+        存储按批次顺序在调用线程中串行完成，同一时刻最多 max_concurrent_batches 个批次在途。
+        嵌入成功的块先进入缓冲区，累计到 store_batch_size 个后一次性写入，减少存储调用次数
         """
         if not blocks:
             return 0, 0, []
 
-        total_blocks = len(blocks)
-        success_count = 0
-        failure_count = 0
-        failed_block_ids = []
+        # 1. 文本增强
+        augmented_texts = self.augmenter.augment_batch(blocks)
+        previews = list(zip(blocks[:preview_count], augmented_texts[:preview_count]))
+        buffer = _StoreBuffer(self.store, self.store_batch_size, self.logger, self.failed_blocks_path)
+        try:
+            self._process_augmented(blocks, augmented_texts, buffer, show_progress)
+        finally:
+            buffer.close()
+        return buffer.success_count, buffer.failure_count, previews
+
+    def _process_augmented(
+        self,
+        blocks: List[ParsedBlock],
+        augmented_texts: List[str],
+        buffer: _StoreBuffer,
+        show_progress: bool
+    ) -> None:
+        """按长度排序分批，嵌入并存储已增强的块"""
+        # 批大小尚未调优时，先用开头的块依次试探候选批大小（这些块正常入库，不会重复处理）
+        start = 0
+        if self.autotune and self._tuned_batch_size is None:
+            start = self._probe_batch_sizes(blocks, augmented_texts, buffer)
+        batch_size = self._tuned_batch_size or self.batch_size
+
+        # 增强文本相同的块（重复的标题、样板内容等）归为一组，每组只嵌入一次，向量由组内各块共用
+        groups: Dict[str, List[ParsedBlock]] = {}
+        for block, text in zip(blocks[start:], augmented_texts[start:]):
+            groups.setdefault(text, []).append(block)
+        unique_texts = sorted(groups, key=len)
+        batches = []
+        for start_idx in range(0, len(unique_texts), batch_size):
+            texts = unique_texts[start_idx:start_idx + batch_size]
+            batch_groups = [groups[text] for text in texts]
+            batch = [block for group in batch_groups for block in group]
+            # 批次内没有重复文本时不需要展开向量
+            counts = [len(group) for group in batch_groups] if len(batch) > len(texts) else None
+            batches.append((batch, texts, counts))
 
-        # 使用迭代器进行批处理
-        iterator = range(0, total_blocks, self.batch_size)
-        if show_progress:
-            iterator = tqdm(iterator, desc="向量化存储", unit="batch")
+        # 进度按块计数，每个批次完成时更新一次；mininterval 限制刷新频率，小批次高速入库时不频繁重绘
+        progress = tqdm(total=len(blocks) - start, desc="向量化存储", unit="block", mininterval=0.5) if show_progress else None
+        try:
+            self._run_batches(batches, buffer, progress)
+            buffer.flush()
+        finally:
+            if progress is not None:
+                progress.close()
 
-        for start_idx in iterator:
-            end_idx = min(start_idx + self.batch_size, total_blocks)
-            batch = blocks[start_idx:end_idx]
+    async def aprocess_single(self, block: ParsedBlock) -> bool:
+        """
+        异步处理单个块（增强 -> 嵌入 -> 存储），返回是否成功；失败块的ID同样追加到失败日志
+        嵌入和存储为阻塞调用，在线程中执行：逐块到达的调用方可用 asyncio.gather 同时处理多个块
+        （以 asyncio.Semaphore 限制并发），各块的网络往返彼此重叠
+        """
+        text = self.augmenter.augment_batch([block])[0]
+        try:
+            vector = (await asyncio.to_thread(self.embedder.process, [text]))[0]
+            if vector is not None:
+                await asyncio.to_thread(self.store.store_single, vector, block)
+                return True
+        except Exception:
+            self.logger.exception("块 %s 处理失败", block.block_id)
+        buffer = _StoreBuffer(self.store, 1, self.logger, self.failed_blocks_path)
+        buffer.fail([block])
+        buffer.close()
+        return False
 
-            try:
-                # 1. 文本增强
-                augmented_pairs = self.augmenter.process(batch)
-                batch_blocks, augmented_texts = zip(*augmented_pairs)
+    def _run_batches(
+        self,
+        batches: List[Tuple[List[ParsedBlock], List[str], Optional[List[int]]]],
+        buffer: _StoreBuffer,
+        progress,
+        embed=None
+    ) -> None:
+        """
+        嵌入各批次并放入存储缓冲区（允许部分失败，继续处理下一批）
+        每个批次为（块列表, 不重复的文本列表, 每个文本对应的块数）；块数为 None 表示文本与块一一对应
+        embed 为嵌入函数，默认 embedder.process
+        """
+        # 循环中反复用到的属性先取为局部变量
+        total = len(batches)
+        embed = embed or self.embedder.process
+        logger = self.logger
+        add, fail = buffer.add, buffer.fail
+        update = progress.update if progress is not None else None
 
+        def finish(index: int, batch: List[ParsedBlock], counts: Optional[List[int]], embed_stage) -> None:
+            """等待批次的嵌入结果，按块数展开后放入存储缓冲区"""
+            try:
                 # 2. 嵌入生成
-                vectors = self.embedder.process(augmented_texts)
+                vectors = embed_stage()
+                if counts is not None:
+                    vectors = [vector for vector, count in zip(vectors, counts) for _ in range(count)]
+                add(batch, vectors)
+            except Exception:
+                fail(batch)
+                logger.exception("批处理失败（批次 %d/%d）", index + 1, total)
+            if update is not None:
+                update(len(batch))
+
+        workers = min(self.max_concurrent_batches, total)
+        if workers <= 1:
+            for index, (batch, texts, counts) in enumerate(batches):
+                finish(index, batch, counts, lambda: embed(texts))
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            submit = executor.submit
+            pending = deque()
+            for index, (batch, texts, counts) in enumerate(batches):
+                pending.append((index, batch, counts, submit(embed, texts)))
+                # 在途批次达到上限时，先存储最早的批次（保持顺序，也限制结果占用的内存）
+                if len(pending) >= workers:
+                    index, batch, counts, future = pending.popleft()
+                    finish(index, batch, counts, future.result)
+            while pending:
+                index, batch, counts, future = pending.popleft()
+                finish(index, batch, counts, future.result)
+
+    def _probe_batch_sizes(self, blocks: List[ParsedBlock], texts: List[str], buffer: _StoreBuffer) -> int:
+        """
+        批大小试探：对尚未计时的候选批大小，各取开头的 批大小×max_concurrent_batches 个块，
+        与正式处理相同地并发执行 嵌入+存储 并记录单块耗时；试探不查询向量缓存，
+        保证计时反映真实的API请求而不是缓存命中。
+        块数不足时保留已有计时，下次调用继续试探。全部候选计时完成后选出单块耗时最小者并持久化
+        返回试探消耗的块数
+        """
+        probe_embed = functools.partial(self.embedder.process, use_cache=False)
+        workers = self.max_concurrent_batches
+        consumed = 0
+        for size in _AUTOTUNE_CANDIDATES:
+            if size in self._probe_timings:
+                continue
+            count = size * workers
+            if consumed + count > len(blocks):
+                break
+            batches = [
+                (blocks[i:i + size], texts[i:i + size], None)
+                for i in range(consumed, consumed + count, size)
+            ]
+            started = time.perf_counter()
+            self._run_batches(batches, buffer, None, embed=probe_embed)
+            buffer.flush()
+            self._probe_timings[size] = (time.perf_counter() - started) / count
+            consumed += count
 
-                # 3. 存储到ChromaDB
-                self.store.process(vectors, list(batch_blocks))
+        if len(self._probe_timings) == len(_AUTOTUNE_CANDIDATES):
+            self._tuned_batch_size = min(self._probe_timings, key=self._probe_timings.get)
+            self.logger.info(f"批大小自动调优完成: batch_size={self._tuned_batch_size}")
+            self._save_tuned_batch_size(self._tuned_batch_size)
+        return consumed
 
-                success_count += len(batch)
-            except Exception as e:
-                # 记录失败块
-                failure_count += len(batch)
-                failed_block_ids.extend([b.block_id for b in batch])
-                # 打印错误信息（实际中可以改为日志）
-                print(f"批处理失败（起始索引 {start_idx}）: {e}")
-                # 继续处理下一批（允许部分失败）
+    def _autotune_path(self) -> str:
+        """调优结果文件路径"""
+        return os.path.join(self.config.chroma_persist_directory, _AUTOTUNE_FILE)
 
-        return success_count, failure_count, failed_block_ids
+    def _autotune_key(self) -> str:
+        """调优结果的键：嵌入模型|集合名"""
+        return f"{self.config.embedding_model}|{self.config.chroma_collection_name}"
 
+    def _load_tuned_batch_size(self) -> Optional[int]:
+        """读取已持久化的调优结果（不存在或损坏时返回 None）"""
+        try:
+            with open(self._autotune_path(), 'r', encoding='utf-8') as f:
+                return json.load(f).get(self._autotune_key())
+        except (OSError, ValueError):
+            return None
+
+    def _save_tuned_batch_size(self, batch_size: int) -> None:
+        """持久化调优结果，写入失败不影响本次处理"""
+        path = self._autotune_path()
+        try:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    tuned = json.load(f)
+            except (OSError, ValueError):
+                tuned = {}
+            tuned[self._autotune_key()] = batch_size
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(tuned, f, ensure_ascii=False)
+        except OSError as e:
+            self.logger.warning("保存批大小调优结果失败: %s", e)
 
     def get_stats(self) -> dict:
         """获取管道统计信息（可扩展）"""
         return {
             "embedding_dimension": self.embedder.get_dimension(),
             "chromadb_collection_count": self.store.get_collection_stats(),
-            "batch_size": self.batch_size,
+            "batch_size": self._tuned_batch_size or self.batch_size,
         }
@@ -1,29 +1,43 @@
+from functools import lru_cache
 from typing import List, Tuple
-from src.common.types import ParsedBlock
+from src.common.types import ParsedBlock, Tag
 from src.config.manager import ConfigManager
 
 
+@lru_cache(maxsize=8192)
+def _render_tags(tags: Tuple[Tag, ...]) -> str:
+    """
+    将标签元组渲染为 "key: value key: value" 前缀（带缓存）
+    同一标题作用域下的块标签相同（Tag 不可变且在块之间共享实例），渲染结果只需计算一次
+    """
+    return " ".join([f"{tag.key}: {tag.value}" for tag in tags])
+
+
 class TextAugmenterNode:
     """文本增强节点：将标签转换为 key: value 格式并拼接在内容前（批处理）"""
 
     def __init__(self, config: ConfigManager = None):
         self.config = config or ConfigManager()
 
-    def _augment_single(self, block: ParsedBlock) -> str:
+    @staticmethod
+    def _augment_single(block: ParsedBlock) -> str:
         """增强单个块的文本"""
-        if block.protected_element_type is not None:
-            # 保护元素块不增强
+        if block.protected_element_type is not None or not block.tags:
+            # 保护元素块不增强；无标签的块原文即结果
             return block.content
-        tag_strs = [f"{tag.key}: {tag.value}" for tag in block.tags]
-        parts = []
-        if tag_strs:
-            parts.extend(tag_strs)
-        parts.append(block.content)
-        return " ".join(parts)
+        return f"{_render_tags(block.tags)} {block.content}"
 
     def augment_batch(self, blocks: List[ParsedBlock]) -> List[str]:
-        """批量增强文本"""
-        return [self._augment_single(block) for block in blocks]
+        """
+        批量增强文本：单个推导式完成，不产生逐块的方法调用；
+        标签前缀按标签元组缓存，相同标签的块只做一次格式化，每块只剩一次字符串拼接
+        """
+        render_tags = _render_tags
+        return [
+            block.content if block.protected_element_type is not None or not block.tags
+            else f"{render_tags(block.tags)} {block.content}"
+            for block in blocks
+        ]
 
     def process(self, blocks: List[ParsedBlock]) -> List[Tuple[ParsedBlock, str]]:
         """处理一批块，返回(块, 增强文本)的列表"""
@@ -0,0 +1,42 @@
+import pytest
+from src.config.manager import ConfigManager
+from src.modules.md_parser.nodes.tag_extractor import TagExtractorNode
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    """按给定的排除规则创建全新的 ConfigManager（绕过单例缓存）"""
+    def _make(exclude_regex):
+        path = tmp_path / "config.yaml"
+        lines = ["tags:", "  exclude_regex:"] + [f"    - '{p}'" for p in exclude_regex]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        ConfigManager._instance = None
+        return ConfigManager(str(path))
+    yield _make
+    ConfigManager._instance = None
+
+
+def test_inline_flag_pattern(make_config):
+    config = make_config(["^#temp$", "(?i)^#ignore/.*"])
+    assert config.is_excluded("#IGNORE/draft")
+    assert config.is_excluded("#temp")
+    assert not config.is_excluded("#topic/python")
+    assert TagExtractorNode(config).extract_from_text("#Ignore/x") is None
+    # 内联标志只作用于所在的规则，不能让其他规则也忽略大小写
+    assert config.exclude_combined is None
+    assert not config.is_excluded("#TEMP")
+
+
+def test_backreference_pattern(make_config):
+    config = make_config(["^#(tmp|temp)$", r"^#(\w+)/\1$"])
+    assert config.is_excluded("#dup/dup")
+    assert not config.is_excluded("#dup/other")
+    assert config.is_excluded("#temp")
+    assert TagExtractorNode(config).extract_from_text("#topic/python").value == "python"
+
+
+def test_plain_patterns_are_combined(make_config):
+    config = make_config(["^#temp$", "^#ignore/.*"])
+    assert config.exclude_combined is not None
+    assert config.is_excluded("#ignore/a")
+    assert not config.is_excluded("#keep")